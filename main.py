@@ -1,9 +1,12 @@
+import heapq
 import os
+import signal
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-import schedule
 from loguru import logger
 
 from tukang_kripto import configs
@@ -14,7 +17,6 @@ from tukang_kripto.technical_analysis import (
     TechnicalAnalysis,
     calculate_profit,
     getAction,
-    getInterval,
 )
 from tukang_kripto.utils import (
     create_alert,
@@ -25,12 +27,26 @@ from tukang_kripto.utils import (
     print_yellow,
 )
 
+# the sinks write from a background thread, logging from a job only enqueues
+logger.remove()
+logger.add(sys.stderr, enqueue=True)
 logger.add(
-    "running_{time}.log", rotation="1 day", format="{time} {level} {message}"
+    "running_{time}.log",
+    rotation="1 day",
+    format="{time} {level} {message}",
+    enqueue=True,
 )  # Once the file is too old, it's rotated
 
+# local time stamp of the transactions written to the csv
+TRANSACTION_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
-def executeJob(app=PublicAPI(), state=AppState(), market="BTC-USDT", time_frame=900):
+
+def executeJob(
+    app=PublicAPI(),
+    state=AppState(),
+    coin=configs.Coin("BTC-USDT", 900, 900),
+    trading_data=None,
+):
     """Trading bot job which runs at a scheduled interval"""
     # increment state.iterations
     state.iterations = state.iterations + 1
@@ -42,22 +58,36 @@ def executeJob(app=PublicAPI(), state=AppState(), market="BTC-USDT", time_frame=
     # 1h = 3600
     # 6h = 21600
     # 1d = 86400
-    trading_data = app.get_historical_data(market, time_frame)
+    if trading_data is None and state.df_cache is None:
+        trading_data = app.get_historical_data(coin.market, coin.time_frame)
+    elif trading_data is None:
+        # only the candles since the previous poll are downloaded
+        trading_data = app.get_latest_candles(
+            coin.market, coin.time_frame, state.df_cache
+        )
     # analyse the market data
-    trading_dataCopy = trading_data.copy()
-    ta = TechnicalAnalysis(trading_dataCopy, state)
-    ta.add_all()
-    df = ta.get_data_frame()
-    df_last = getInterval(df)
+    latest = trading_data.iloc[-1]
+    if state.df_cache is not None and latest.equals(state.last_candle):
+        # same candle as the previous poll, reuse its indicators and state.flags
+        df = state.df_cache
+    else:
+        ta = TechnicalAnalysis(trading_data, state)
+        if state.df_cache is None:
+            ta.add_all()
+        else:
+            # only the candles since the previous poll need analysing
+            ta.update_tail(state.df_cache)
+        df = ta.get_data_frame()
+        state.df_cache = df
+        state.last_candle = latest
     # print(df)
-    if len(df_last) > 0:
-        price = float(df_last["close"].values[0])
-        now = datetime.today().strftime("%Y-%m-%d %H:%M:%S")
+    if len(df) > 0:
+        price = float(df["close"].iat[-1])
         state.action = getAction(
-            now, app, price, df, df_last, state.last_action, False, state
+            app, price, df, state.last_action, False, state, state.flags
         )
-        trade_conf = configs.coin(market)["indodax"]
-        indodax = Indodax(trade_conf)
+        indodax = state.indodax
+        trade_conf = indodax.config
         harga = indodax.get_best_bids_price()
 
         if not harga:
@@ -72,7 +102,11 @@ def executeJob(app=PublicAPI(), state=AppState(), market="BTC-USDT", time_frame=
         state.market_price = harga  # update new price
         state.last_close_price = price
         logger.warning(
-            f"\n=>   {state.action} {str(df_last['date'].values[0])[:16]} {in_rupiah(harga)} / {price_changes}"
+            "\n=>   {} {:%Y-%m-%d %H:%M} {} / {}",
+            state.action,
+            df["date"].iat[-1],
+            in_rupiah(harga),
+            price_changes,
         )
         # if a buy signal
         if state.action == "BUY":
@@ -104,7 +138,7 @@ def executeJob(app=PublicAPI(), state=AppState(), market="BTC-USDT", time_frame=
                 top1_sell = indodax.get_top_sale_price(0)
 
                 transaction = {
-                    "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "date": time.strftime(TRANSACTION_DATE_FORMAT),
                     "coin_name": trade_conf["symbol"],
                     "type": "buy",
                     "coin_amount": bought_coin,
@@ -115,11 +149,11 @@ def executeJob(app=PublicAPI(), state=AppState(), market="BTC-USDT", time_frame=
 
                 if configs.enable_notification():
                     msg = f"Top Bids: {in_rupiah(harga)} | Top Ask: {in_rupiah(top1_sell)} | \nMau Beli di harga {in_rupiah(price_per_coin)} sebanyak {float(bought_coin)} koin !"
-                    create_alert(f"{state.action} {market} {state.buy_count}", msg)
+                    create_alert(f"{state.action} {coin.market} {state.buy_count}", msg)
             else:
                 if configs.enable_notification():
                     create_alert(
-                        f"Gagal {state.action} {market} {state.buy_count}",
+                        f"Gagal {state.action} {coin.market} {state.buy_count}",
                         f"kita mau beli di harga {in_rupiah(price_per_coin)} sebanyak {bought_coin}!",
                     )
 
@@ -151,7 +185,7 @@ def executeJob(app=PublicAPI(), state=AppState(), market="BTC-USDT", time_frame=
                     top1_sell = indodax.get_top_sale_price(0)
                     last_buy_coin = indodax.get_last_buy_price()
                     transaction = {
-                        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        "date": time.strftime(TRANSACTION_DATE_FORMAT),
                         "coin_name": trade_conf["symbol"],
                         "type": "sell",
                         "coin_amount": sold_coin,
@@ -181,48 +215,134 @@ if __name__ == "__main__":
     print("Bot lagi gelar lapak")
     logger.info("Siap Memulai!")
     config_data = configs.read_config()
+    if hasattr(signal, "SIGHUP"):
+        # `kill -HUP <pid>` re-reads config.json without restarting the bot
+        signal.signal(signal.SIGHUP, lambda *_: configs.reload())
 
     # executeJob('asal')
     app = PublicAPI()
-    states = {}
+    states = {coin.market: AppState(coin.market) for coin in configs.all_coins()}
+    stop_event = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=min(16, len(configs.all_coins())))
+    # fetch rounds get their own thread so they don't hold a worker the jobs need
+    fetcher = ThreadPoolExecutor(max_workers=1)
+    # markets with a job queued or running, guarded by in_flight_lock
+    in_flight = set()
+    in_flight_lock = threading.Lock()
+
+    def claim(coins):
+        # a market whose previous job overran its pool_time sits this round out,
+        # two jobs on one AppState could both place an order
+        with in_flight_lock:
+            free = [coin for coin in coins if coin.market not in in_flight]
+            in_flight.update(coin.market for coin in free)
+        for coin in coins:
+            if coin not in free:
+                logger.warning("Job {} masih jalan, dilewati dulu", coin.market)
+        return free
+
+    def release(market):
+        with in_flight_lock:
+            in_flight.discard(market)
+
+    def submit_to_pool(app, state, coin, trading_data):
+        # run the job on the pool so a slow market doesn't hold up the others
+        future = executor.submit(executeJob, app, state, coin, trading_data)
+        future.add_done_callback(log_job_error)
+        future.add_done_callback(lambda _: release(coin.market))
+
+    def log_job_error(future):
+        if future.exception() is not None:
+            logger.error("Job gagal: {}", future.exception())
+
+    def fetch_batch(coins):
+        # one fetch round per time frame, then every market is analysed on its own
+        by_time_frame = {}
+        for coin in coins:
+            by_time_frame.setdefault(coin.time_frame, []).append(coin)
+        for time_frame, group in by_time_frame.items():
+            markets = [coin.market for coin in group]
+            history = {
+                market: states[market].df_cache
+                for market in markets
+                if states[market].df_cache is not None
+            }
+            frames = app.get_historical_data_batch(markets, time_frame, history)
+            for coin in group:
+                # a market whose fetch failed sits this round out
+                if coin.market in frames:
+                    yield coin, frames[coin.market]
+
+    def submit_batch(coins):
+        pending = {coin.market for coin in coins}
+        try:
+            for coin, trading_data in fetch_batch(coins):
+                submit_to_pool(app, states[coin.market], coin, trading_data)
+                pending.discard(coin.market)
+        finally:
+            # markets whose fetch failed are free again for their next round
+            for market in pending:
+                release(market)
 
     def runApp():
-        for coin in configs.all_coins():
-            if coin["market"] not in states.keys():
-                states[coin["market"]] = AppState(coin["market"])
-            coin_name = coin["market"].split("-")[0]
-            # First execution init
-            executeJob(app, states[coin["market"]], coin["market"], coin["time_frame"])
+        coins = configs.all_coins()
+        for coin in coins:
+            coin_name = coin.market.split("-")[0]
             create_csv_transaction(coin_name)
-            logger.info(
-                f"Membuat job pengecekan {coin['market']} setiap {coin['pool_time']} detik"
+            # one Indodax wrapper per market for the whole run
+            state = states[coin.market]
+            state.indodax = Indodax(state.config_trade, coin.pool_time / 4)
+
+        # First execution init, all markets fetched at once
+        list(
+            executor.map(
+                lambda job: executeJob(app, states[job[0].market], *job),
+                fetch_batch(coins),
             )
-            schedule.every(coin["pool_time"]).seconds.do(
-                executeJob,
-                app,
-                states[coin["market"]],
-                coin["market"],
-                coin["time_frame"],
+        )
+
+        # min-heap of (next run, coin) deadlines on the monotonic clock
+        jobs = []
+        start = time.monotonic()
+        for coin in coins:
+            logger.info(
+                "Membuat job pengecekan {} setiap {} detik", coin.market, coin.pool_time
             )
+            heapq.heappush(jobs, (start + coin.pool_time, coin))
 
-        while True:
-            schedule.run_pending()
-            time.sleep(1)
+        # sleep until the next job is due instead of waking up every second
+        while jobs and not stop_event.is_set():
+            next_run, coin = jobs[0]
+            if stop_event.wait(timeout=max(0, next_run - time.monotonic())):
+                break
+            # markets that fall due together share one fetch round
+            due = []
+            while jobs and jobs[0][0] <= time.monotonic():
+                next_run, coin = jobs[0]
+                due.append(coin)
+                heapq.heapreplace(jobs, (next_run + coin.pool_time, coin))
+            due = claim(due)
+            if due:
+                fetcher.submit(submit_batch, due).add_done_callback(log_job_error)
 
     try:
         runApp()
     # catches a keyboard break of app, exits gracefully
     except KeyboardInterrupt:
+        stop_event.set()
+        fetcher.shutdown(wait=False, cancel_futures=True)
+        executor.shutdown(wait=False, cancel_futures=True)
         print(datetime.now(), "Tutup lapak")
         try:
-            for coin in configs.all_coins():
-                if coin["market"] in states.keys():
-                    print_red(f'coin_name: {states[coin["market"]].coin_name}')
-                    print_green(f'buy_count: {states[coin["market"]].buy_count}')
-                    print_green(f'buy_sum: {states[coin["market"]].buy_sum}')
-                    print("sell_count:", states[coin["market"]].sell_count)
-                    print("sell_sum:", states[coin["market"]].sell_sum)
-                    print_yellow("=========== \n")
+            for state in states.values():
+                print_red(f"coin_name: {state.coin_name}")
+                print_green(f"buy_count: {state.buy_count}")
+                print_green(f"buy_sum: {state.buy_sum}")
+                print("sell_count:", state.sell_count)
+                print("sell_sum:", state.sell_sum)
+                print_yellow("=========== \n")
+            # flush what the background log writer still has queued
+            logger.complete()
             sys.exit(0)
         except SystemExit:
             os._exit(0)
@@ -0,0 +1,19 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from tukang_kripto import configs
+
+TEMPLATE = Path(__file__).resolve().parent.parent / "config.template.json"
+
+
+@pytest.fixture(autouse=True)
+def config_file(tmp_path, monkeypatch):
+    # AppState reads config.json from the working directory
+    path = tmp_path / "config.json"
+    shutil.copy(TEMPLATE, path)
+    monkeypatch.chdir(tmp_path)
+    configs.reload()
+    yield path
+    configs.reload()
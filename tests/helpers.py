@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+
+from tukang_kripto.public_API import DATA_COLUMNS
+
+
+def candles(close, market="BTC-USDT", volume=1.0):
+    """Candle frame shaped like get_historical_data, every price at the close"""
+    close = np.asarray(close, dtype=np.float64)
+    ts = pd.date_range("2021-01-01", periods=close.size, freq="15min", name="ts")
+    return pd.DataFrame(
+        {
+            "date": ts,
+            "market": market,
+            "granularity": 900,
+            "low": close,
+            "high": close,
+            "open": close,
+            "close": close,
+            "volume": volume,
+        },
+        index=ts,
+    )[list(DATA_COLUMNS)]
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tests.helpers import candles
+from tukang_kripto.app_state import AppState
+from tukang_kripto.indicators import ema_values
+from tukang_kripto.technical_analysis import TechnicalAnalysis
+
+# prices that drifted an ulp when the EMA recursion ran on an unchanged close
+FLAT_PRICES = [99.0, 0.1, 0.3, 1.7, 123.45, 27123.99, 0.00001234, 150000000.0]
+
+
+@pytest.mark.parametrize("price", FLAT_PRICES)
+@pytest.mark.parametrize("period", [5, 12, 20, 26])
+def test_ema_of_flat_closes_stays_on_the_close(price, period):
+    close = np.full(300, price)
+    expected = pd.Series(close).ewm(span=period, adjust=False).mean().to_numpy()
+
+    ema = ema_values(close, period)
+
+    assert np.array_equal(ema, expected)
+    assert (ema == price).all()
+
+
+@pytest.mark.parametrize("period", [5, 12, 20, 26])
+def test_ema_of_repeated_closes_matches_pandas(period):
+    close = np.repeat(np.random.default_rng(4).random(30) * 1000, 10)
+    expected = pd.Series(close).ewm(span=period, adjust=False).mean().to_numpy()
+
+    assert np.array_equal(ema_values(close, period), expected)
+
+
+@pytest.mark.parametrize("price", FLAT_PRICES)
+def test_flat_closes_raise_no_ema_signal(price):
+    ta = TechnicalAnalysis(candles(np.full(300, price)), AppState("BTC-USDT"))
+    ta.add_moving_average_signals()
+    df = ta.get_data_frame()
+
+    for flag in ("golden_cross_ema", "death_cross_ema", "ema12gtema26"):
+        assert not df[flag].any(), flag
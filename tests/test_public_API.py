@@ -0,0 +1,113 @@
+import json
+import time
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tukang_kripto.public_API import PublicAPI
+
+GRANULARITY = 60
+
+
+class FakeCoinbase:
+    """Answers candle requests like Coinbase, from candles up to the current minute"""
+
+    def __init__(self, candles=1000):
+        now = int(time.time() // GRANULARITY) * GRANULARITY
+        self.epochs = now - GRANULARITY * np.arange(candles)[::-1]
+        self.missing = set()
+        self.broken = set()
+        self.requests = []
+
+    def request(self, method, url):
+        query = {k: v[0] for k, v in parse_qs(urlsplit(url).query).items()}
+        market = urlsplit(url).path.split("/")[2]
+        self.requests.append(query)
+        if market in self.broken:
+            return self.respond({"message": "NotFound"})
+
+        epochs = self.epochs
+        if query.get("start"):
+            start = pd.Timestamp(query["start"]).timestamp()
+            end = pd.Timestamp(query["end"]).timestamp()
+            if (end - start) / GRANULARITY > 300:
+                return self.respond(
+                    {"message": "granularity too small for the requested time range"}
+                )
+            epochs = epochs[(epochs >= start) & (epochs <= end)]
+        else:
+            epochs = epochs[-300:]
+        epochs = [int(e) for e in epochs if e not in self.missing]
+        # newest first, [time, low, high, open, close, volume]
+        rows = [[e, e % 97, e % 97 + 2, e % 97 + 1, e % 97 + 1, 10] for e in epochs]
+        return self.respond(rows[::-1])
+
+    @staticmethod
+    def respond(payload):
+        return SimpleNamespace(data=json.dumps(payload).encode())
+
+
+@pytest.fixture
+def api():
+    api = PublicAPI()
+    api.http = FakeCoinbase()
+    return api
+
+
+def test_latest_candles_stitch_onto_history(api):
+    expected = api.get_historical_data("BTC-USD", GRANULARITY)
+    history = expected.iloc[:-3]
+    api.http.requests.clear()
+
+    latest = api.get_latest_candles("BTC-USD", GRANULARITY, history)
+
+    # one request, from the last (forming) candle of history on
+    assert len(api.http.requests) == 1
+    start = pd.Timestamp(api.http.requests[0]["start"])
+    assert start == history["date"].iat[-1].tz_localize("UTC")
+    pd.testing.assert_frame_equal(latest, expected.tail(len(history)))
+
+
+def test_latest_candles_refetch_when_they_dont_line_up(api):
+    history = api.get_historical_data("BTC-USD", GRANULARITY).iloc[:-3]
+    # the candle history ends on never comes back, the windows can't be stitched
+    api.http.missing.add(int(history["date"].iat[-1].timestamp()))
+    api.http.requests.clear()
+
+    latest = api.get_latest_candles("BTC-USD", GRANULARITY, history)
+
+    assert [bool(q.get("start")) for q in api.http.requests] == [True, False]
+    assert latest["date"].iat[-1] == pd.Timestamp(api.http.epochs[-1], unit="s")
+
+
+def test_latest_candles_refetch_after_a_gap_over_one_request(api):
+    full = api.get_historical_data("BTC-USD", GRANULARITY)
+    # last seen 400 candles ago, more than one request may cover
+    history = full.copy()
+    history["date"] = history["date"] - pd.Timedelta(seconds=400 * GRANULARITY)
+    api.http.requests.clear()
+
+    latest = api.get_latest_candles("BTC-USD", GRANULARITY, history)
+
+    assert [bool(q.get("start")) for q in api.http.requests] == [False]
+    pd.testing.assert_frame_equal(latest, full)
+
+
+def test_error_payload_raises_a_clear_error(api):
+    api.http.broken.add("BAD-USD")
+
+    with pytest.raises(ValueError, match="BAD-USD.*NotFound"):
+        api.get_historical_data("BAD-USD", GRANULARITY)
+
+
+def test_batch_leaves_out_only_the_failing_market(api):
+    api.http.broken.add("BAD-USD")
+    markets = ["BTC-USD", "BAD-USD", "ETH-USD"]
+
+    frames = api.get_historical_data_batch(markets, GRANULARITY)
+
+    assert sorted(frames) == ["BTC-USD", "ETH-USD"]
+    assert all(len(df) == 300 for df in frames.values())
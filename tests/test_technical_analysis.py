@@ -0,0 +1,47 @@
+import json
+
+import numpy as np
+
+from tests.helpers import candles
+from tukang_kripto import configs
+from tukang_kripto.app_state import AppState
+from tukang_kripto.technical_analysis import TechnicalAnalysis
+
+
+def test_update_tail_works_without_a_btc_usdt_config(config_file):
+    config = json.loads(config_file.read_text())
+    config["coins"] = [c for c in config["coins"] if c["market"] == "MATIC-USD"]
+    config_file.write_text(json.dumps(config))
+    configs.reload()
+
+    close = 1 + np.sin(np.arange(300) / 7) / 10
+    data = candles(close, market="MATIC-USD")
+    state = AppState("MATIC-USD")
+    previous = TechnicalAnalysis(data.iloc[:298], state)
+    previous.add_all()
+
+    ta = TechnicalAnalysis(data, state)
+    ta.update_tail(previous.get_data_frame())
+    full = TechnicalAnalysis(data, AppState("MATIC-USD"))
+    full.add_all()
+
+    assert np.allclose(ta.get_data_frame()["ema26"], full.get_data_frame()["ema26"])
+    assert state.flags == full.state.flags
+
+
+def test_update_tail_matches_add_all_on_a_sliding_window():
+    rng = np.random.default_rng(7)
+    close = 100 + np.cumsum(rng.normal(0, 1, 302))
+    data = candles(close, volume=rng.random(302) * 1000)
+    # the previous poll saw candles 0-299, this one 2-301
+    previous = TechnicalAnalysis(data.iloc[:300], AppState())
+    previous.add_all()
+
+    ta = TechnicalAnalysis(data.iloc[2:], AppState())
+    ta.update_tail(previous.get_data_frame())
+    full = TechnicalAnalysis(data.iloc[2:], AppState())
+    full.add_all()
+
+    got, expected = ta.get_data_frame(), full.get_data_frame()
+    for column in ("obv", "obv_pc", "cma"):
+        assert np.array_equal(got[column], expected[column]), column
@@ -0,0 +1,22 @@
+import pytest
+
+from tukang_kripto.utils import create_csv_transaction, get_latest_csv_transaction
+
+BUY = {
+    "date": "2021-01-01 00:00:00",
+    "coin_name": "BTC",
+    "type": "buy",
+    "coin_amount": 0.001,
+    "price": 500000000,
+    "amount": 500000,
+}
+
+
+def test_latest_csv_transaction_is_shared_read_only():
+    create_csv_transaction("BTC", BUY)
+
+    last_buy = get_latest_csv_transaction("BTC/IDR", "buy")
+    with pytest.raises(TypeError):
+        last_buy[4] = "0"
+
+    assert get_latest_csv_transaction("BTC/IDR", "buy")[4] == "500000000"
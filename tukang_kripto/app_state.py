@@ -31,3 +31,7 @@ class AppState:
         self.trend = "bullish"
         self.on_stop_loss = False
         self.in_position = True
+        self.df_cache = None
+        self.last_candle = None
+        self.flags = {}
+        self.indodax = None
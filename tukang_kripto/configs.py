@@ -1,37 +1,56 @@
 import json
+from functools import lru_cache
+from typing import NamedTuple
 
 
+class Coin(NamedTuple):
+    market: str
+    time_frame: int
+    pool_time: int
+
+
+@lru_cache(maxsize=None)
 def read_config():
-    f = open("config.json")
-    return json.load(f)
+    with open("config.json") as f:
+        return json.load(f)
 
 
-config = read_config()
+def reload():
+    """Forget the parsed config, the next call reads config.json again"""
+    for cached in (read_config, all_coins, coin_index):
+        cached.cache_clear()
 
 
 def enable_desktop_alert():
-    return config.get("desktop_alert", False) is True
+    return read_config().get("desktop_alert", False) is True
 
 
 def enable_notification():
-    return config.get("notification", False) is True
+    return read_config().get("notification", False) is True
 
 
 def enable_telegram():
-    telegram = config.get("telegram", {})
+    telegram = read_config().get("telegram", {})
     config_empty = not telegram
     return config_empty is False
 
 
+@lru_cache(maxsize=None)
 def all_coins():
-    return config["coins"]
+    return tuple(
+        Coin(coin["market"], coin["time_frame"], coin["pool_time"])
+        for coin in read_config()["coins"]
+    )
+
+
+@lru_cache(maxsize=None)
+def coin_index():
+    return {coin["market"]: coin for coin in read_config()["coins"]}
 
 
 def coin(name):
-    for index, coin in enumerate(config["coins"]):
-        if coin["market"] == name:
-            return config["coins"][index]
+    return coin_index().get(name)
 
 
 def run_in_debug():
-    return config.get("debug", False)
+    return read_config().get("debug", False)
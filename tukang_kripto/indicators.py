@@ -0,0 +1,256 @@
+from numpy import (
+    arange,
+    bool_,
+    concatenate,
+    cumsum,
+    empty_like,
+    maximum,
+    nan,
+    ndarray,
+    zeros,
+)
+from pandas import Series
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional, numpy/pandas are used without it
+    njit = None
+
+# candlestick columns in the row order candle_kernel() returns them
+CANDLE_PATTERNS = (
+    "hammer",
+    "shooting_star",
+    "hanging_man",
+    "inverted_hammer",
+    "three_white_soldiers",
+    "three_black_crows",
+    "doji",
+    "three_line_strike",
+    "two_black_gapping",
+    "morning_star",
+    "evening_star",
+    "abandoned_baby",
+    "morning_doji_star",
+    "evening_doji_star",
+    "astral_buy",
+    "astral_sell",
+)
+
+if njit is not None:
+
+    # nogil lets the market jobs on the executor pool run the kernels side by side
+    @njit(cache=True, nogil=True)
+    def ema_kernel(values, alpha):
+        # same recursion as ewm(adjust=False) without pandas' NaN bookkeeping,
+        # including its skip on an unchanged value so flat closes don't drift an ulp
+        out = empty_like(values)
+        out[0] = values[0]
+        for i in range(1, values.size):
+            if out[i - 1] != values[i]:
+                out[i] = alpha * values[i] + (1 - alpha) * out[i - 1]
+            else:
+                out[i] = out[i - 1]
+        return out
+
+    @njit(cache=True, nogil=True)
+    def sma_kernel(values, period):
+        # running window sum, the first period - 1 windows are shorter
+        out = empty_like(values)
+        total = 0.0
+        for i in range(values.size):
+            total += values[i]
+            if i >= period:
+                total -= values[i - period]
+            out[i] = total / min(i + 1, period)
+        return out
+
+    @njit(cache=True, nogil=True)
+    def ewm_mean_kernel(values, alpha, min_periods):
+        # ewm(adjust=True).mean() for a series without NaNs, in the same order of
+        # operations as pandas so the averages come out identical
+        out = empty_like(values)
+        weighted = values[0]
+        old_wt = 1.0
+        for i in range(values.size):
+            if i > 0:
+                old_wt *= 1 - alpha
+                if weighted != values[i]:
+                    weighted = (old_wt * weighted + values[i]) / (old_wt + 1.0)
+                old_wt += 1.0
+            out[i] = weighted if i + 1 >= min_periods else nan
+        return out
+
+    # error_model="numpy": a zero high-low range divides to inf/nan like pandas does
+    @njit(cache=True, nogil=True, error_model="numpy")
+    def candle_kernel(o, h, l, c):
+        # every TechnicalAnalysis.candle_*() pattern in one pass over the candles,
+        # a pattern stays False on rows its shifts would have made NaN
+        out = zeros((len(CANDLE_PATTERNS), c.size), dtype=bool_)
+        for i in range(c.size):
+            o0, h0, l0, c0 = o[i], h[i], l[i], c[i]
+            body0 = abs(o0 - c0)
+            top0 = max(o0, c0)
+            bottom0 = min(o0, c0)
+
+            # hammer, inverted hammer and doji only look at this candle
+            out[0, i] = (
+                h0 - l0 > 3 * (o0 - c0)
+                and (c0 - l0) / (0.001 + h0 - l0) > 0.6
+                and (o0 - l0) / (0.001 + h0 - l0) > 0.6
+            )
+            out[3, i] = (
+                h0 - l0 > 3 * (o0 - c0)
+                and (h0 - c0) / (0.001 + h0 - l0) > 0.6
+                and (h0 - o0) / (0.001 + h0 - l0) > 0.6
+            )
+            out[6, i] = (
+                abs(c0 - o0) / (h0 - l0) < 0.1
+                and h0 - top0 > 3 * body0
+                and bottom0 - l0 > 3 * body0
+            )
+            if i < 1:
+                continue
+
+            o1, h1, l1, c1 = o[i - 1], h[i - 1], l[i - 1], c[i - 1]
+            body1 = abs(o1 - c1)
+            top1 = max(o1, c1)
+            bottom1 = min(o1, c1)
+
+            out[1, i] = (
+                o1 < c1 and c1 < o0 and h0 - top0 >= body0 * 3 and bottom0 - l0 <= body0
+            )
+            if i < 2:
+                continue
+
+            o2, h2, l2, c2 = o[i - 2], h[i - 2], l[i - 2], c[i - 2]
+            body2 = abs(o2 - c2)
+
+            out[2, i] = (
+                h0 - l0 > 4 * (o0 - c0)
+                and (c0 - l0) / (0.001 + h0 - l0) >= 0.75
+                and (o0 - l0) / (0.001 + h0 - l0) >= 0.75
+                and h1 < o0
+                and h2 < o0
+            )
+            out[4, i] = (
+                o0 > o1
+                and o0 < c1
+                and c0 > h1
+                and h0 - top0 < body0
+                and o1 > o2
+                and o1 < c2
+                and c1 > h2
+                and h1 - top1 < body1
+            )
+            out[5, i] = (
+                o0 < o1
+                and o0 > c1
+                and c0 < l1
+                and l0 - top0 < body0
+                and o1 < o2
+                and o1 > c2
+                and c1 < l2
+                and l1 - top1 < body1
+            )
+            out[8, i] = (
+                o0 < o1 and o0 > c1 and c0 < l1 and l0 - top0 < body0 and h1 < l2
+            )
+            out[9, i] = top1 < c2 and c2 < o2 and c0 > o0 and o0 > top1
+            out[10, i] = bottom1 > c2 and c2 > o2 and c0 < o0 and o0 < bottom1
+            out[11, i] = o0 < c0 and h1 < l0 and o2 > c2 and h1 < l2
+            # the pandas doji star expressions compare their whole & chain with the
+            # last "> 3 * body1", so that term is kept as the chain evaluates it:
+            # the lower shadow must be non zero and 1 > 3 * body1
+            doji_star_tail = (
+                h1 - top1 > 3 * body1 and bottom1 - l1 != 0 and 1 > 3 * body1
+            )
+            out[12, i] = (
+                c2 < o2
+                and body2 / (h2 - l2) >= 0.7
+                and body1 / (h1 - l1) < 0.1
+                and c0 > o0
+                and body0 / (h0 - l0) >= 0.7
+                and c2 > c1
+                and c2 > o1
+                and c1 < o0
+                and o1 < o0
+                and c0 > c2
+                and doji_star_tail
+            )
+            out[13, i] = (
+                c2 > o2
+                and body2 / (h2 - l2) >= 0.7
+                and body1 / (h1 - l1) < 0.1
+                and c0 < o0
+                and body0 / (h0 - l0) >= 0.7
+                and c2 < c1
+                and c2 < o1
+                and c1 > o0
+                and o1 > o0
+                and c0 < c2
+                and doji_star_tail
+            )
+            if i < 3:
+                continue
+
+            o3, h3, l3, c3 = o[i - 3], h[i - 3], l[i - 3], c[i - 3]
+            out[7, i] = (
+                o1 < o2
+                and o1 > c2
+                and c1 < l2
+                and l1 - top1 < body1
+                and o2 < o3
+                and o2 > c3
+                and c2 < l3
+                and l2 - max(o2, c2) < body2
+                and o0 < l1
+                and c0 > h3
+            )
+            if i < 12:
+                continue
+
+            # astral: eight candles in a row below/above the closes 3 and the
+            # lows/highs 5 candles before them
+            buy = True
+            sell = True
+            for j in range(i, i - 8, -1):
+                buy = buy and c[j] < c[j - 3] and l[j] < l[j - 5]
+                sell = sell and c[j] > c[j - 3] and h[j] > h[j - 5]
+                if not (buy or sell):
+                    break
+            out[14, i] = buy
+            out[15, i] = sell
+        return out
+
+else:
+    ema_kernel = None
+    sma_kernel = None
+    ewm_mean_kernel = None
+    candle_kernel = None
+
+
+def sma_values(close: ndarray, period: int) -> ndarray:
+    """Simple moving average of a float64 array, rolling(min_periods=1) semantics"""
+    if sma_kernel is not None:
+        return sma_kernel(close, period)
+
+    # every window sum is one subtraction of running totals, the first
+    # period - 1 windows are shorter just like rolling(min_periods=1)
+    totals = concatenate(([0.0], cumsum(close)))
+    ends = arange(1, close.size + 1)
+    starts = maximum(ends - period, 0)
+    return (totals[ends] - totals[starts]) / (ends - starts)
+
+
+def ema_values(close: ndarray, period: int) -> ndarray:
+    """Exponential moving average of a float64 array, ewm(adjust=False) semantics"""
+    if ema_kernel is None:
+        return Series(close).ewm(span=period, adjust=False).mean().to_numpy()
+    return ema_kernel(close, 2.0 / (period + 1))
+
+
+def ewm_mean_values(values: ndarray, com: float, min_periods: int = 0) -> ndarray:
+    """Exponentially weighted mean of a float64 array, ewm(com=com) semantics"""
+    if ewm_mean_kernel is None:
+        return Series(values).ewm(com=com, min_periods=min_periods).mean().to_numpy()
+    return ewm_mean_kernel(values, 1.0 / (1.0 + com), min_periods)
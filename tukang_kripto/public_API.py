@@ -1,14 +1,54 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Union
+from urllib.parse import urlencode
 
+import numpy as np
 import pandas as pd
-import requests
+import urllib3
+from loguru import logger
 
-from tukang_kripto.utils import print_red
+try:
+    from orjson import loads as json_loads
+except ImportError:  # stdlib json parses the same payload, only slower
+    from json import loads as json_loads
 
 DEFAULT_MARKET = "BTC-USDT"
-SUPPORTED_GRANULARITY = [60, 300, 900, 3600, 21600, 86400]
-FREQUENCY_EQUIVALENTS = ["T", "5T", "15T", "H", "6H", "D"]
+SUPPORTED_GRANULARITY = (60, 300, 900, 3600, 21600, 86400)
+# index frequency per granularity, as offsets since the old "T"/"H" aliases are
+# gone from recent pandas
+GRANULARITY_FREQUENCY = {
+    granularity: pd.Timedelta(seconds=granularity)
+    for granularity in SUPPORTED_GRANULARITY
+}
 MAX_GRANULARITY = max(SUPPORTED_GRANULARITY)
+# Coinbase rate limits public endpoints, cap the requests in flight at once
+MAX_CONCURRENT_REQUESTS = 4
+# Coinbase returns at most this many candles per request
+MAX_CANDLES_PER_REQUEST = 300
+# start to end of a full request, both ends are included in the response
+WINDOW_WIDTH = {
+    granularity: timedelta(seconds=granularity * (MAX_CANDLES_PER_REQUEST - 1))
+    for granularity in SUPPORTED_GRANULARITY
+}
+# a stalled read shouldn't hold a request slot for long
+REQUEST_TIMEOUT = urllib3.Timeout(connect=3.05, read=15)
+# fields of one Coinbase candle, in the order the API sends them
+CANDLE_COLUMNS = ("epoch", "low", "high", "open", "close", "volume")
+# columns get_historical_data() returns, in order
+DATA_COLUMNS = (
+    "date",
+    "market",
+    "granularity",
+    "low",
+    "high",
+    "open",
+    "close",
+    "volume",
+)
 
 
 class PublicAPI:
@@ -17,6 +57,23 @@ class PublicAPI:
         self.debug = False
         self.die_on_api_error = False
         self.api_url = "https://api.pro.coinbase.com"
+        self.request_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+        # one keep-alive pool shared by every market, saves a TLS handshake per poll,
+        # plain urllib3 skips the requests session overhead for these bare GETs
+        self.http = urllib3.PoolManager(
+            maxsize=16,
+            timeout=REQUEST_TIMEOUT,
+            # rate limited or flaky responses are retried on the same connection
+            retries=urllib3.Retry(
+                total=3, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504]
+            ),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.http.clear()
 
     def get_historical_data(
         self,
@@ -24,14 +81,16 @@ class PublicAPI:
         granularity: int = MAX_GRANULARITY,
         iso8601start: str = "",
         iso8601end: str = "",
-    ) -> pd.DataFrame:
+        as_frame: bool = True,
+    ) -> Union[pd.DataFrame, dict]:
+        """Candles for market, as a DataFrame or (as_frame=False) a dict of arrays"""
 
         # validates granularity is an integer
         if not isinstance(granularity, int):
             raise TypeError("Granularity integer required.")
 
         # validates the granularity is supported by Coinbase Pro
-        if not granularity in SUPPORTED_GRANULARITY:
+        if granularity not in GRANULARITY_FREQUENCY:
             raise TypeError(
                 "Granularity options: " + ", ".join(map(str, SUPPORTED_GRANULARITY))
             )
@@ -46,61 +105,179 @@ class PublicAPI:
 
         # if only a start date is provided
         if iso8601start != "" and iso8601end == "":
-            multiplier = int(granularity / 60)
-
-            # calculate the end date using the granularity
-            iso8601end = str(
-                (
-                    datetime.strptime(iso8601start, "%Y-%m-%dT%H:%M:%S.%f")
-                    + timedelta(minutes=granularity * multiplier)
-                ).isoformat()
-            )
+            # end the window where a single request's worth of candles does
+            iso8601end = (
+                datetime.fromisoformat(iso8601start) + WINDOW_WIDTH[granularity]
+            ).isoformat()
 
+        if iso8601end != "" and self.__is_closed_window(granularity, iso8601end):
+            # every candle in the window has closed, the response can't change;
+            # callers get their own copy so the cached frame stays as fetched
+            df = self.__fetch_window(market, granularity, iso8601start, iso8601end)
+            df = df.copy()
+        else:
+            # the window still holds the forming candle, its data can change
+            df = self.__fetch_candles(market, granularity, iso8601start, iso8601end)
+
+        if as_frame:
+            return df
+        # views of the frame's blocks, no further copy; market and granularity
+        # are left out, the caller already knows them
+        arrays = {"ts": df.index.to_numpy()}
+        arrays.update((column, df[column].to_numpy()) for column in CANDLE_COLUMNS[1:])
+        return arrays
+
+    @lru_cache(maxsize=512)
+    def __fetch_window(
+        self, market: str, granularity: int, iso8601start: str, iso8601end: str
+    ):
+        return self.__fetch_candles(market, granularity, iso8601start, iso8601end)
+
+    @staticmethod
+    def __is_closed_window(granularity: int, iso8601end: str) -> bool:
+        """Has the last candle of the window already closed?"""
+
+        try:
+            end = pd.Timestamp(iso8601end)
+        except ValueError:
+            # not a date we can read, leave it to the API
+            return False
+        if end is pd.NaT:
+            return False
+        if end.tzinfo is None:
+            end = end.tz_localize("UTC")
+        # the candle opening at end closes one granularity later
+        return end.timestamp() + granularity <= time.time()
+
+    def __fetch_candles(
+        self, market: str, granularity: int, iso8601start: str, iso8601end: str
+    ) -> pd.DataFrame:
         # resp = self.authAPI('GET', f"products/{market}/candles?granularity={granularity}&start={iso8601start}&end={iso8601end}")
-        now = datetime.today().strftime("%Y-%m-%d %H:%M:%S")
-        print_red(
-            f"{now} Checking Coin '{market}' Candles at timeframe {granularity/60} minutes"
+        logger.info(
+            "Checking Coin '{}' Candles at timeframe {} minutes",
+            market,
+            granularity / 60,
         )
-        resp = requests.get(
-            f"{self.api_url}/products/{market}/candles?granularity={granularity}&start={iso8601start}&end={iso8601end}"
-        ).json()
+        # encoded, a "+00:00" offset in the dates would otherwise read as a space
+        query = urlencode(
+            {"granularity": granularity, "start": iso8601start, "end": iso8601end}
+        )
+        url = f"{self.api_url}/products/{market}/candles?{query}"
+        with self.request_slots:
+            resp = json_loads(self.http.request("GET", url).data)
         # print(resp)
-        # convert the API response into a Pandas DataFrame
-        df = pd.DataFrame(
-            resp, columns=["epoch", "low", "high", "open", "close", "volume"]
+        if not isinstance(resp, list):
+            # Coinbase answers errors (a range over 300 candles, unknown market)
+            # with a {"message": ...} object instead of the candle list
+            raise ValueError(f"Coinbase candles error for {market}: {resp}")
+        # every candle field is numeric, one float64 block skips pandas' per-element
+        # type inference, reversed (a view) so the earliest candle comes first
+        candles = np.asarray(resp, dtype=np.float64).reshape(-1, len(CANDLE_COLUMNS))
+        candles = candles[::-1]
+
+        # the epochs are whole unix seconds, cast them straight to datetimes
+        # instead of going through to_datetime's parsing machinery
+        epoch = candles[:, 0].astype(np.int64)
+        tsidx = pd.DatetimeIndex(epoch.view("datetime64[s]").astype("datetime64[ns]"))
+        if (np.diff(epoch) == granularity).all():
+            # only an evenly spaced series (no missing candles) can carry a freq
+            tsidx.freq = GRANULARITY_FREQUENCY[granularity]
+
+        # the same value on every row, stored once as a single category
+        codes = np.zeros(len(epoch), dtype=np.int8)
+        columns = {
+            "date": tsidx,
+            "market": pd.Categorical.from_codes(codes, categories=[market]),
+            "granularity": pd.Categorical.from_codes(codes, categories=[granularity]),
+        }
+        # the epoch never becomes a column, it only lives on as the index
+        columns.update(zip(CANDLE_COLUMNS[1:], candles[:, 1:].T))
+
+        # built in DATA_COLUMNS order in one go, no inserts or re-order copy after
+        df = pd.DataFrame(columns, index=tsidx)
+        df.index.names = ["ts"]
+
+        return df
+
+    def get_latest_candles(
+        self, market: str, granularity: int, history: pd.DataFrame
+    ) -> pd.DataFrame:
+        """Brings a previously fetched candle window up to date
+
+        Only the candles from the last (still forming) one in history onward are
+        requested, the returned window keeps the length of history.
+        """
+
+        since = history["date"].iat[-1]
+        # the candle dates are naive UTC, the request range is sent tz-aware
+        start = since.tz_localize("UTC") if since.tzinfo is None else since
+        now = pd.Timestamp.now("UTC")
+        if now - start > WINDOW_WIDTH[granularity]:
+            # more candles behind than one request returns, start over
+            return self.get_historical_data(market, granularity)
+
+        recent = self.get_historical_data(
+            market, granularity, start.isoformat(), now.isoformat()
         )
-        # reverse the order of the response with earliest last
-        df = df.iloc[::-1].reset_index()
+        if len(recent) == 0 or recent["date"].iat[0] != since:
+            # too far behind to stitch both windows together, start over
+            return self.get_historical_data(market, granularity)
 
-        try:
-            freq = FREQUENCY_EQUIVALENTS[SUPPORTED_GRANULARITY.index(granularity)]
-        except:
-            freq = "D"
+        older = history.loc[history["date"] < since, recent.columns]
+        return pd.concat([older, recent]).tail(len(history))
 
-        # convert the DataFrame into a time series with the date as the index/key
-        try:
-            tsidx = pd.DatetimeIndex(
-                pd.to_datetime(df["epoch"], unit="s"), dtype="datetime64[ns]", freq=freq
-            )
-            df.set_index(tsidx, inplace=True)
-            df = df.drop(columns=["epoch", "index"])
-            df.index.names = ["ts"]
-            df["date"] = tsidx
-        except ValueError:
-            tsidx = pd.DatetimeIndex(
-                pd.to_datetime(df["epoch"], unit="s"), dtype="datetime64[ns]"
-            )
-            df.set_index(tsidx, inplace=True)
-            df = df.drop(columns=["epoch", "index"])
-            df.index.names = ["ts"]
-            df["date"] = tsidx
+    def get_historical_data_batch(
+        self, markets: list, granularity: int = MAX_GRANULARITY, history: dict = None
+    ) -> dict:
+        """Fetch candles for several markets at once, keyed by market
 
-        df["market"] = market
-        df["granularity"] = granularity
+        Markets with a previous window in history only download the new candles.
+        A market whose fetch fails is logged and left out of the result.
+        """
 
-        # re-order columns
-        df = df[
-            ["date", "market", "granularity", "low", "high", "open", "close", "volume"]
+        history = history or {}
+
+        def fetch(market):
+            try:
+                if market in history:
+                    return self.get_latest_candles(market, granularity, history[market])
+                return self.get_historical_data(market, granularity)
+            except Exception as e:
+                # one failing market mustn't hold back the others in the batch
+                logger.error("Gagal ambil candle {}: {}", market, e)
+                return None
+
+        # Coinbase has no multi-product candles endpoint, so issue the requests
+        # side by side, still bounded by request_slots
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as pool:
+            frames = dict(zip(markets, pool.map(fetch, markets)))
+        return {market: df for market, df in frames.items() if df is not None}
+
+    def get_historical_data_range(
+        self,
+        market: str,
+        granularity: int,
+        iso8601start: str,
+        iso8601end: str,
+    ) -> pd.DataFrame:
+        """Fetch a range longer than one request can return
+
+        The range is split into windows of MAX_CANDLES_PER_REQUEST candles that are
+        fetched side by side and joined earliest first.
+        """
+
+        start = pd.Timestamp(iso8601start)
+        end = pd.Timestamp(iso8601end)
+        candle = pd.Timedelta(seconds=granularity)
+        step = candle * MAX_CANDLES_PER_REQUEST
+        windows = [
+            (first.isoformat(), min(first + step - candle, end).isoformat())
+            for first in pd.date_range(start, end, freq=step)
         ]
 
-        return df
+        def fetch(window):
+            return self.get_historical_data(market, granularity, *window)
+
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as pool:
+            df = pd.concat(pool.map(fetch, windows))
+        return df[~df.index.duplicated()]
@@ -1,19 +1,104 @@
-from datetime import datetime
+from bisect import bisect_left, insort
 
 import pandas as pd
 from loguru import logger
-from numpy import floor, maximum, mean, minimum, nan, ndarray
-from numpy import sum as np_sum
-from numpy import where
+from numpy import (
+    arange,
+    array,
+    concatenate,
+    cumsum,
+    empty_like,
+    errstate,
+    flatnonzero,
+    float64,
+    floor,
+    maximum,
+    mean,
+    minimum,
+    nan,
+    ndarray,
+    searchsorted,
+    where,
+    zeros,
+)
 from pandas import DataFrame, Series
 
 from tukang_kripto.app_state import AppState
-from tukang_kripto.public_API import PublicAPI
+from tukang_kripto.indicators import (
+    CANDLE_PATTERNS,
+    candle_kernel,
+    ema_values,
+    ewm_mean_values,
+    sma_values,
+)
+from tukang_kripto.public_API import DATA_COLUMNS, PublicAPI
 from tukang_kripto.utils import get_latest_csv_transaction, in_rupiah
 
+# rows before the new candles update_tail() recomputes the window indicators on
+TAIL_LOOKBACK = 20
+
+# Fibonacci Bollinger Bands, each ratio is the multiple of sd added to the mid band
+FIBONACCI_BAND_COLUMNS = (
+    "fbb_upper0_236",
+    "fbb_upper0_382",
+    "fbb_upper0_5",
+    "fbb_upper0_618",
+    "fbb_upper0_764",
+    "fbb_upper1",
+    "fbb_lower0_236",
+    "fbb_lower0_382",
+    "fbb_lower0_5",
+    "fbb_lower0_618",
+    "fbb_lower0_764",
+    "fbb_lower1",
+)
+FIBONACCI_BAND_RATIOS = array(
+    [0.236, 0.382, 0.5, 0.618, 0.764, 1, -0.236, -0.382, -0.5, -0.618, -0.764, -1]
+)
+
+# Fibonacci retracement levels lowest first, each offset is the multiple of the
+# close range added to the highest close (ratio1 is the lowest close itself)
+FIBONACCI_RETRACEMENT_LEVELS = (
+    "ratio1",
+    "ratio0_768",
+    "ratio0_618",
+    "ratio0_5",
+    "ratio0_382",
+    "ratio0_286",
+    "ratio0",
+    "ratio1_272",
+    "ratio1_414",
+    "ratio1_618",
+)
+FIBONACCI_RETRACEMENT_OFFSETS = array(
+    [-1, -0.768, -0.618, -0.5, -0.382, -0.286, 0, 0.272, 0.414, 0.618]
+)
+
+# last row flags getAction() decides on, stored on the state as plain bools
+SIGNAL_FLAGS = [
+    "ema12ltema26",
+    "ema12gtema26",
+    "golden_cross",
+    "golden_cross_ema",
+    "death_cross_ema",
+    "hammer",
+    "inverted_hammer",
+    "hanging_man",
+    "shooting_star",
+    "three_white_soldiers",
+    "three_black_crows",
+    "morning_star",
+    "evening_star",
+    "three_line_strike",
+    "abandoned_baby",
+    "morning_doji_star",
+    "evening_doji_star",
+    "two_black_gapping",
+]
+
 
 class TechnicalAnalysis:
-    def __init__(self, data=DataFrame(), state=AppState()) -> None:
+    def __init__(self, data: DataFrame = None, state: AppState = None) -> None:
         """Technical Analysis object model
 
         Parameters
@@ -22,33 +107,33 @@ class TechnicalAnalysis:
             data[ts] = [ 'date', 'market', 'granularity', 'low', 'high', 'open', 'close', 'volume' ]
         """
 
+        # defaults are built per instance, a shared AppState() would leak between them
+        if data is None:
+            data = DataFrame()
+        if state is None:
+            state = AppState()
+
         if not isinstance(data, DataFrame):
             raise TypeError("Data is not a Pandas dataframe.")
 
-        if list(data.keys()) != [
-            "date",
-            "market",
-            "granularity",
-            "low",
-            "high",
-            "open",
-            "close",
-            "volume",
-        ]:
+        if tuple(data.columns) != DATA_COLUMNS:
             raise ValueError(
                 "Data not not contain date, market, granularity, low, high, open, close, volume"
             )
 
-        if not "close" in data.columns:
-            raise AttributeError("Pandas DataFrame 'close' column required.")
-
         if not data["close"].dtype == "float64" and not data["close"].dtype == "int64":
             raise AttributeError(
                 "Pandas DataFrame 'close' column not int64 or float64."
             )
 
-        self.df = data
+        # shallow copy, the indicator columns are added without touching data
+        self.df = data.copy(deep=False)
+        self.state = state
         self.levels = []
+        # memo of __shifted() and __spans() while add_candlestick_patterns runs
+        self.shifts = None
+        # prices of self.levels kept sorted, for the nearest level lookup
+        self.level_prices = []
 
     def simple_moving_average(self, period: int) -> float:
         """Calculates the Simple Moving Average (SMA)"""
@@ -62,7 +147,8 @@ class TechnicalAnalysis:
         if len(self.df) < period:
             raise Exception("Data range too small.")
 
-        return self.df.close.rolling(period, min_periods=1).mean()
+        close = self.df["close"].to_numpy(float64)
+        return Series(sma_values(close, period), index=self.df.index)
 
     def exponential_moving_average(self, period: int) -> float:
         """Calculates the Exponential Moving Average (EMA)"""
@@ -76,7 +162,8 @@ class TechnicalAnalysis:
         if len(self.df) < period:
             raise Exception("Data range too small.")
 
-        return self.df.close.ewm(span=period, adjust=False).mean()
+        close = self.df["close"].to_numpy(float64)
+        return Series(ema_values(close, period), index=self.df.index)
 
     def add_sma(self, period: int) -> None:
         """Add the Simple Moving Average (SMA) to the DataFrame"""
@@ -106,6 +193,42 @@ class TechnicalAnalysis:
 
         self.df["ema" + str(period)] = self.exponential_moving_average(period)
 
+    def add_moving_average_signals(self) -> None:
+        """Adds the SMA/EMA columns with their cross signals in one pass over close
+
+        Same columns as add_sma, add_ema, add_golden_cross, add_death_cross and
+        add_ema_buy_signals, computed on plain arrays and assigned at once.
+        """
+
+        if len(self.df) < 50:
+            raise Exception("Data range too small.")
+
+        close = self.df["close"].to_numpy(float64)
+        sma = {period: sma_values(close, period) for period in (5, 20, 50)}
+        ema = {period: ema_values(close, period) for period in (5, 12, 20, 26)}
+        above = ema[12] > ema[26]
+        below = ema[12] < ema[26]
+        golden, death = self.__crosses(sma[5], sma[20])
+        golden_ema, death_ema = self.__crosses(ema[5], ema[20])
+
+        self.df = self.df.assign(
+            sma20=sma[20],
+            sma50=sma[50],
+            ema12=ema[12],
+            ema26=ema[26],
+            sma5=sma[5],
+            golden_cross=golden,
+            ema5=ema[5],
+            ema20=ema[20],
+            golden_cross_ema=golden_ema,
+            deathcross=death,
+            death_cross_ema=death_ema,
+            ema12gtema26=above,
+            ema12gtema26co=self.__cross_over(above),
+            ema12ltema26=below,
+            ema12ltema26co=self.__cross_over(below),
+        )
+
     def add_golden_cross(self) -> None:
         """Add Golden Cross SMA5 over SMA20"""
 
@@ -116,21 +239,21 @@ class TechnicalAnalysis:
             self.add_sma(20)
 
         # self.df["goldencross"] = self.df["sma5"] > self.df["sma20"]
-        previous_5 = self.df["sma5"].shift(1)
-        previous_20 = self.df["sma20"].shift(1)
-        self.df["golden_cross"] = (self.df["sma5"] > self.df["sma20"]) & (
-            previous_5 <= previous_20
+        golden, _ = self.__crosses(
+            self.df["sma5"].to_numpy(), self.df["sma20"].to_numpy()
         )
+        self.df["golden_cross"] = golden
 
         # EMA
-        if not "ema5" or not "ema20" in self.df.columns:
+        if "ema5" not in self.df:
             self.add_ema(5)
+
+        if "ema20" not in self.df:
             self.add_ema(20)
-        previous_5 = self.df["ema5"].shift(1)
-        previous_20 = self.df["ema20"].shift(1)
-        self.df["golden_cross_ema"] = (self.df["ema5"] > self.df["ema20"]) & (
-            previous_5 <= previous_20
+        golden_ema, _ = self.__crosses(
+            self.df["ema5"].to_numpy(), self.df["ema20"].to_numpy()
         )
+        self.df["golden_cross_ema"] = golden_ema
 
     def add_death_cross(self) -> None:
         """Add Death Cross SMA5 over SMA20"""
@@ -142,21 +265,21 @@ class TechnicalAnalysis:
             self.add_sma(20)
 
         # self.df["deathcross"] = self.df["sma5"] < self.df["sma20"]
-        previous_5 = self.df["sma5"].shift(1)
-        previous_20 = self.df["sma20"].shift(1)
-        self.df["deathcross"] = (self.df["sma5"] < self.df["sma20"]) & (
-            previous_5 >= previous_20
+        _, death = self.__crosses(
+            self.df["sma5"].to_numpy(), self.df["sma20"].to_numpy()
         )
+        self.df["deathcross"] = death
 
         # EMA
-        if not "ema5" or not "ema20" in self.df.columns:
+        if "ema5" not in self.df:
             self.add_ema(5)
+
+        if "ema20" not in self.df:
             self.add_ema(20)
-        previous_5e = self.df["ema5"].shift(1)
-        previous_20e = self.df["ema20"].shift(1)
-        self.df["death_cross_ema"] = (self.df["ema5"] < self.df["ema20"]) & (
-            previous_5e >= previous_20e
+        _, death_ema = self.__crosses(
+            self.df["ema5"].to_numpy(), self.df["ema20"].to_numpy()
         )
+        self.df["death_cross_ema"] = death_ema
 
     def add_ema_buy_signals(self) -> None:
         """Adds the EMA12/EMA26 buy and sell signals to the DataFrame"""
@@ -175,25 +298,24 @@ class TechnicalAnalysis:
                 "Pandas DataFrame 'close' column not int64 or float64."
             )
 
-        if not "ema12" or not "ema26" in self.df.columns:
+        if "ema12" not in self.df:
             self.add_ema(12)
-            self.add_ema(26)
 
-        # true if EMA12 is above the EMA26
-        self.df["ema12gtema26"] = self.df.ema12 > self.df.ema26
-        # true if the current frame is where EMA12 crosses over above
-        self.df["ema12gtema26co"] = self.df.ema12gtema26.ne(
-            self.df.ema12gtema26.shift()
-        )
-        self.df.loc[self.df["ema12gtema26"] == False, "ema12gtema26co"] = False
+        if "ema26" not in self.df:
+            self.add_ema(26)
 
-        # true if the EMA12 is below the EMA26
-        self.df["ema12ltema26"] = self.df.ema12 < self.df.ema26
-        # true if the current frame is where EMA12 crosses over below
-        self.df["ema12ltema26co"] = self.df.ema12ltema26.ne(
-            self.df.ema12ltema26.shift()
+        ema12 = self.df["ema12"].to_numpy()
+        ema26 = self.df["ema26"].to_numpy()
+        # true if EMA12 is above / below the EMA26
+        above = ema12 > ema26
+        below = ema12 < ema26
+        # the co columns are true on the frame where EMA12 crosses over above / below
+        self.df = self.df.assign(
+            ema12gtema26=above,
+            ema12gtema26co=self.__cross_over(above),
+            ema12ltema26=below,
+            ema12ltema26co=self.__cross_over(below),
         )
-        self.df.loc[self.df["ema12ltema26"] == False, "ema12ltema26co"] = False
 
     def add_sma_buy_signals(self) -> None:
         """Adds the SMA50/SMA200 buy and sell signals to the DataFrame"""
@@ -212,37 +334,30 @@ class TechnicalAnalysis:
                 "Pandas DataFrame 'close' column not int64 or float64."
             )
 
-        if not "sma50" or not "sma200" in self.df.columns:
+        if "sma50" not in self.df:
             self.add_sma(50)
-            self.add_sma(200)
 
-        # true if SMA50 is above the SMA200
-        self.df["sma50gtsma200"] = self.df.sma50 > self.df.sma200
-        # true if the current frame is where SMA50 crosses over above
-        self.df["sma50gtsma200co"] = self.df.sma50gtsma200.ne(
-            self.df.sma50gtsma200.shift()
-        )
-        self.df.loc[self.df["sma50gtsma200"] == False, "sma50gtsma200co"] = False
+        if "sma200" not in self.df:
+            self.add_sma(200)
 
-        # true if the SMA50 is below the SMA200
-        self.df["sma50ltsma200"] = self.df.sma50 < self.df.sma200
-        # true if the current frame is where SMA50 crosses over below
-        self.df["sma50ltsma200co"] = self.df.sma50ltsma200.ne(
-            self.df.sma50ltsma200.shift()
+        sma50 = self.df["sma50"].to_numpy()
+        sma200 = self.df["sma200"].to_numpy()
+        # true if SMA50 is above / below the SMA200
+        above = sma50 > sma200
+        below = sma50 < sma200
+        # the co columns are true on the frame where SMA50 crosses over above / below
+        self.df = self.df.assign(
+            sma50gtsma200=above,
+            sma50gtsma200co=self.__cross_over(above),
+            sma50ltsma200=below,
+            sma50ltsma200co=self.__cross_over(below),
         )
-        self.df.loc[self.df["sma50ltsma200"] == False, "sma50ltsma200co"] = False
 
     def add_all(self) -> None:
         """Adds analysis to the DataFrame"""
-        self.add_sma(20)
-        self.add_sma(50)
         # self.addSMA(200)
-        self.add_ema(12)
-        self.add_ema(26)
-        self.add_CMA(),
-        self.add_golden_cross()
-        self.add_death_cross()
-        self.add_ema_buy_signals()
+        self.add_moving_average_signals()
+        self.add_CMA()
         self.add_fibonacci_bollinger_bands()
         self.add_relative_strength_index(14)
         self.add_MACD()
@@ -250,8 +365,108 @@ class TechnicalAnalysis:
         self.add_elder_ray_index()
         self.add_MACD_buy_signals()
         self.add_sma_buy_signals()
-        self.add_sma_buy_signals()
-        self.add_MACD_buy_signals()
+        self.add_candlestick_patterns()
+        self.store_flags()
+
+    def update_tail(self, analysed: DataFrame) -> None:
+        """Adds analysis to the DataFrame reusing a previous add_all() result
+
+        Only the candles from the last analysed one onward (it was still forming)
+        are computed, the moving averages continue from the previous row.
+        """
+
+        new_rows = self.df[self.df["date"] >= analysed["date"].iat[-1]]
+        if len(new_rows) > 0:
+            history = analysed[analysed["date"] < new_rows["date"].iat[0]].tail(
+                len(self.df) - len(new_rows)
+            )
+        if len(new_rows) == 0 or len(history) < TAIL_LOOKBACK:
+            self.add_all()
+            return
+
+        n_new = len(new_rows)
+        closes = pd.concat([history["close"], new_rows["close"]])
+        window = TechnicalAnalysis(
+            pd.concat([history[self.df.columns].tail(TAIL_LOOKBACK), new_rows]),
+            self.state,
+        )
+
+        def extend(column, values):
+            window.df[column] = list(history[column].tail(TAIL_LOOKBACK)) + list(values)
+
+        for column in analysed.columns:
+            if column.startswith("sma") and column[3:].isdigit():
+                period = int(column[3:])
+                sma = closes.tail(n_new + period - 1).rolling(period, min_periods=1)
+                extend(column, sma.mean().tail(n_new))
+            elif column.startswith("ema") and column[3:].isdigit():
+                extend(
+                    column,
+                    self.__recurrence(
+                        history[column].iat[-1], new_rows["close"], int(column[3:])
+                    ),
+                )
+
+        macd = window.df["ema12"].tail(n_new) - window.df["ema26"].tail(n_new)
+        extend("macd", macd)
+        extend("signal", self.__recurrence(history["signal"].iat[-1], macd, 9))
+
+        # the RSI smoothing state isn't kept, it is cheap enough on the whole series
+        rsi = self.calculate_relative_strength_index(closes, 14).fillna(50)
+        extend("rsi14", rsi.tail(n_new))
+
+        window.add_golden_cross()
+        window.add_death_cross()
+        window.add_ema_buy_signals()
+        window.add_fibonacci_bollinger_bands()
+        window.add_elder_ray_index()
+        window.add_MACD_buy_signals()
+        window.add_sma_buy_signals()
+        window.add_candlestick_patterns()
+
+        self.df = pd.concat(
+            [history, window.df.tail(n_new).reindex(columns=analysed.columns)]
+        )
+        # obv and cma accumulate from the first candle, which moves with the window,
+        # so they are redone over the whole frame instead of continued
+        self.add_on_balance_volume()
+        self.add_CMA()
+        self.store_flags()
+
+    def store_flags(self) -> None:
+        """Stores the last row signal flags on the state"""
+        self.state.flags = {flag: bool(self.df[flag].iat[-1]) for flag in SIGNAL_FLAGS}
+
+    def __recurrence(self, previous: float, values: Series, period: int) -> list:
+        """Continues an exponential moving average from its previous value"""
+
+        alpha = 2 / (period + 1)
+        result = []
+        for value in values:
+            # ewm leaves the average as is when the value equals it
+            if previous != value:
+                previous = alpha * value + (1 - alpha) * previous
+            result.append(previous)
+        return result
+
+    def __cross_over(self, condition: ndarray) -> ndarray:
+        # true only on the rows where condition turns true, including the first row
+        crossed = condition.copy()
+        crossed[1:] &= ~condition[:-1]
+        return crossed
+
+    def __crosses(self, fast: ndarray, slow: ndarray) -> tuple:
+        # (golden, death): true where fast moved above / below slow since the
+        # previous row, never the first; one difference serves both directions
+        gap = fast - slow
+        golden = zeros(gap.size, dtype=bool)
+        death = zeros(gap.size, dtype=bool)
+        golden[1:] = (gap[1:] > 0) & (gap[:-1] <= 0)
+        death[1:] = (gap[1:] < 0) & (gap[:-1] >= 0)
+        return golden, death
+
+    def add_candlestick_patterns(self) -> None:
+        """Adds the candlestick patterns to the DataFrame"""
 
         """
         Candlestick References
@@ -261,22 +476,39 @@ class TechnicalAnalysis:
         https://www.incrediblecharts.com/candlestick_patterns/candlestick-patterns-strongest.php
         """
 
-        self.df["hammer"] = self.candle_hammer()
-        self.df["shooting_star"] = self.candle_shooting_star()
-        self.df["hanging_man"] = self.candle_hanging_man()
-        self.df["inverted_hammer"] = self.candle_inverted_hammer()
-        self.df["three_white_soldiers"] = self.candle_three_white_soldiers()
-        self.df["three_black_crows"] = self.candle_three_black_crows()
-        self.df["doji"] = self.candle_doji()
-        self.df["three_line_strike"] = self.candle_three_line_strike()
-        self.df["two_black_gapping"] = self.candle_two_black_gapping()
-        self.df["morning_star"] = self.candle_morning_star()
-        self.df["evening_star"] = self.candle_evening_star()
-        self.df["abandoned_baby"] = self.candle_abandoned_baby()
-        self.df["morning_doji_star"] = self.candle_morning_doji_star()
-        self.df["evening_doji_star"] = self.candle_evening_doji_star()
-        self.df["astral_buy"] = self.candle_astral_buy()
-        self.df["astral_sell"] = self.candle_astral_sell()
+        if candle_kernel is not None:
+            # one fused pass over the candles instead of a dozen Series per pattern
+            patterns = candle_kernel(
+                self.df["open"].to_numpy(dtype=float64),
+                self.df["high"].to_numpy(dtype=float64),
+                self.df["low"].to_numpy(dtype=float64),
+                self.df["close"].to_numpy(dtype=float64),
+            )
+            self.df = self.df.assign(**dict(zip(CANDLE_PATTERNS, patterns)))
+            return
+
+        # the patterns reuse the same few shifted columns and candle spans,
+        # compute each one once
+        self.shifts = {}
+        self.df = self.df.assign(
+            hammer=self.candle_hammer(),
+            shooting_star=self.candle_shooting_star(),
+            hanging_man=self.candle_hanging_man(),
+            inverted_hammer=self.candle_inverted_hammer(),
+            three_white_soldiers=self.candle_three_white_soldiers(),
+            three_black_crows=self.candle_three_black_crows(),
+            doji=self.candle_doji(),
+            three_line_strike=self.candle_three_line_strike(),
+            two_black_gapping=self.candle_two_black_gapping(),
+            morning_star=self.candle_morning_star(),
+            evening_star=self.candle_evening_star(),
+            abandoned_baby=self.candle_abandoned_baby(),
+            morning_doji_star=self.candle_morning_doji_star(),
+            evening_doji_star=self.candle_evening_doji_star(),
+            astral_buy=self.candle_astral_buy(),
+            astral_sell=self.candle_astral_sell(),
+        )
+        self.shifts = None
 
     def get_data_frame(self) -> DataFrame:
         """Returns the Pandas DataFrame"""
@@ -284,369 +516,273 @@ class TechnicalAnalysis:
 
     def candle_hammer(self) -> Series:
         """* Candlestick Detected: Hammer ("Weak - Reversal - Bullish Signal - Up"""
-        return (
-            (
-                (self.df["high"] - self.df["low"])
-                > 3 * (self.df["open"] - self.df["close"])
-            )
-            & (
-                (
-                    (self.df["close"] - self.df["low"])
-                    / (0.001 + self.df["high"] - self.df["low"])
-                )
-                > 0.6
-            )
-            & (
-                (
-                    (self.df["open"] - self.df["low"])
-                    / (0.001 + self.df["high"] - self.df["low"])
-                )
-                > 0.6
-            )
+        o0, h0, l0, c0 = self.__shifted(0)
+        range0, padded0, change0 = self.__spans(0)[:3]
+        return self.__series(
+            (range0 > 3 * change0)
+            & ((c0 - l0) / padded0 > 0.6)
+            & ((o0 - l0) / padded0 > 0.6)
         )
 
     def candle_shooting_star(self) -> Series:
         """* Candlestick Detected: Shooting Star ("Weak - Reversal - Bearish Pattern - Down")"""
-        return (
-            (
-                (self.df["open"].shift(1) < self.df["close"].shift(1))
-                & (self.df["close"].shift(1) < self.df["open"])
-            )
-            & (
-                self.df["high"] - maximum(self.df["open"], self.df["close"])
-                >= (abs(self.df["open"] - self.df["close"]) * 3)
-            )
-            & (
-                (minimum(self.df["close"], self.df["open"]) - self.df["low"])
-                <= abs(self.df["open"] - self.df["close"])
-            )
+        o0, h0, l0, c0 = self.__shifted(0)
+        o1, h1, l1, c1 = self.__shifted(1)
+        body0, top0, bottom0 = self.__spans(0)[3:]
+        return self.__series(
+            (o1 < c1) & (c1 < o0) & (h0 - top0 >= body0 * 3) & (bottom0 - l0 <= body0)
         )
 
     def candle_hanging_man(self) -> Series:
         """* Candlestick Detected: Hanging Man ("Weak - Continuation - Bearish Pattern - Down")"""
-        return (
-            (
-                (self.df["high"] - self.df["low"])
-                > (4 * (self.df["open"] - self.df["close"]))
-            )
-            & (
-                (
-                    (self.df["close"] - self.df["low"])
-                    / (0.001 + self.df["high"] - self.df["low"])
-                )
-                >= 0.75
-            )
-            & (
-                (
-                    (self.df["open"] - self.df["low"])
-                    / (0.001 + self.df["high"] - self.df["low"])
-                )
-                >= 0.75
-            )
-            & (self.df["high"].shift(1) < self.df["open"])
-            & (self.df["high"].shift(2) < self.df["open"])
+        o0, h0, l0, c0 = self.__shifted(0)
+        h1 = self.__shifted(1)[1]
+        h2 = self.__shifted(2)[1]
+        range0, padded0, change0 = self.__spans(0)[:3]
+        return self.__series(
+            (range0 > 4 * change0)
+            & ((c0 - l0) / padded0 >= 0.75)
+            & ((o0 - l0) / padded0 >= 0.75)
+            & (h1 < o0)
+            & (h2 < o0)
         )
 
     def candle_inverted_hammer(self) -> Series:
         """* Candlestick Detected: Inverted Hammer ("Weak - Continuation - Bullish Pattern - Up")"""
-        return (
-            (
-                (self.df["high"] - self.df["low"])
-                > 3 * (self.df["open"] - self.df["close"])
-            )
-            & (
-                (self.df["high"] - self.df["close"])
-                / (0.001 + self.df["high"] - self.df["low"])
-                > 0.6
-            )
-            & (
-                (self.df["high"] - self.df["open"])
-                / (0.001 + self.df["high"] - self.df["low"])
-                > 0.6
-            )
+        o0, h0, l0, c0 = self.__shifted(0)
+        range0, padded0, change0 = self.__spans(0)[:3]
+        return self.__series(
+            (range0 > 3 * change0)
+            & ((h0 - c0) / padded0 > 0.6)
+            & ((h0 - o0) / padded0 > 0.6)
         )
 
     def candle_three_white_soldiers(self):
         """*** Candlestick Detected: Three White Soldiers ("Strong - Reversal - Bullish Pattern - Up")"""
-
-        return (
-            (
-                (self.df["open"] > self.df["open"].shift(1))
-                & (self.df["open"] < self.df["close"].shift(1))
-            )
-            & (self.df["close"] > self.df["high"].shift(1))
-            & (
-                self.df["high"] - maximum(self.df["open"], self.df["close"])
-                < (abs(self.df["open"] - self.df["close"]))
-            )
-            & (
-                (self.df["open"].shift(1) > self.df["open"].shift(2))
-                & (self.df["open"].shift(1) < self.df["close"].shift(2))
-            )
-            & (self.df["close"].shift(1) > self.df["high"].shift(2))
-            & (
-                self.df["high"].shift(1)
-                - maximum(self.df["open"].shift(1), self.df["close"].shift(1))
-                < (abs(self.df["open"].shift(1) - self.df["close"].shift(1)))
-            )
+        o0, h0, l0, c0 = self.__shifted(0)
+        o1, h1, l1, c1 = self.__shifted(1)
+        o2, h2, l2, c2 = self.__shifted(2)
+        body0, top0 = self.__spans(0)[3:5]
+        body1, top1 = self.__spans(1)[3:5]
+        return self.__series(
+            (o0 > o1)
+            & (o0 < c1)
+            & (c0 > h1)
+            & (h0 - top0 < body0)
+            & (o1 > o2)
+            & (o1 < c2)
+            & (c1 > h2)
+            & (h1 - top1 < body1)
         )
 
     def candle_three_black_crows(self) -> Series:
         """* Candlestick Detected: Three Black Crows ("Strong - Reversal - Bearish Pattern - Down")"""
-        return (
-            (
-                (self.df["open"] < self.df["open"].shift(1))
-                & (self.df["open"] > self.df["close"].shift(1))
-            )
-            & (self.df["close"] < self.df["low"].shift(1))
-            & (
-                self.df["low"] - maximum(self.df["open"], self.df["close"])
-                < (abs(self.df["open"] - self.df["close"]))
-            )
-            & (
-                (self.df["open"].shift(1) < self.df["open"].shift(2))
-                & (self.df["open"].shift(1) > self.df["close"].shift(2))
-            )
-            & (self.df["close"].shift(1) < self.df["low"].shift(2))
-            & (
-                self.df["low"].shift(1)
-                - maximum(self.df["open"].shift(1), self.df["close"].shift(1))
-                < (abs(self.df["open"].shift(1) - self.df["close"].shift(1)))
-            )
+        o0, h0, l0, c0 = self.__shifted(0)
+        o1, h1, l1, c1 = self.__shifted(1)
+        o2, h2, l2, c2 = self.__shifted(2)
+        body0, top0 = self.__spans(0)[3:5]
+        body1, top1 = self.__spans(1)[3:5]
+        return self.__series(
+            (o0 < o1)
+            & (o0 > c1)
+            & (c0 < l1)
+            & (l0 - top0 < body0)
+            & (o1 < o2)
+            & (o1 > c2)
+            & (c1 < l2)
+            & (l1 - top1 < body1)
         )
 
     def candle_doji(self) -> Series:
         """! Candlestick Detected: Doji ("Indecision")"""
-
-        return (
-            (
-                (
-                    abs(self.df["close"] - self.df["open"])
-                    / (self.df["high"] - self.df["low"])
-                )
-                < 0.1
-            )
-            & (
-                (self.df["high"] - maximum(self.df["close"], self.df["open"]))
-                > (3 * abs(self.df["close"] - self.df["open"]))
-            )
-            & (
-                (minimum(self.df["close"], self.df["open"]) - self.df["low"])
-                > (3 * abs(self.df["close"] - self.df["open"]))
+        o0, h0, l0, c0 = self.__shifted(0)
+        range0, _, _, body0, top0, bottom0 = self.__spans(0)
+        with errstate(divide="ignore", invalid="ignore"):
+            return self.__series(
+                (body0 / range0 < 0.1)
+                & (h0 - top0 > 3 * body0)
+                & (bottom0 - l0 > 3 * body0)
             )
-        )
 
     def candle_three_line_strike(self) -> Series:
         """** Candlestick Detected: Three Line Strike ("Reliable - Reversal - Bullish Pattern - Up")"""
-
-        return (
-            (
-                (self.df["open"].shift(1) < self.df["open"].shift(2))
-                & (self.df["open"].shift(1) > self.df["close"].shift(2))
-            )
-            & (self.df["close"].shift(1) < self.df["low"].shift(2))
-            & (
-                self.df["low"].shift(1)
-                - maximum(self.df["open"].shift(1), self.df["close"].shift(1))
-                < (abs(self.df["open"].shift(1) - self.df["close"].shift(1)))
-            )
-            & (
-                (self.df["open"].shift(2) < self.df["open"].shift(3))
-                & (self.df["open"].shift(2) > self.df["close"].shift(3))
-            )
-            & (self.df["close"].shift(2) < self.df["low"].shift(3))
-            & (
-                self.df["low"].shift(2)
-                - maximum(self.df["open"].shift(2), self.df["close"].shift(2))
-                < (abs(self.df["open"].shift(2) - self.df["close"].shift(2)))
-            )
-            & (
-                (self.df["open"] < self.df["low"].shift(1))
-                & (self.df["close"] > self.df["high"].shift(3))
-            )
+        o0, h0, l0, c0 = self.__shifted(0)
+        o1, h1, l1, c1 = self.__shifted(1)
+        o2, h2, l2, c2 = self.__shifted(2)
+        o3, h3, l3, c3 = self.__shifted(3)
+        body1, top1 = self.__spans(1)[3:5]
+        body2, top2 = self.__spans(2)[3:5]
+        return self.__series(
+            (o1 < o2)
+            & (o1 > c2)
+            & (c1 < l2)
+            & (l1 - top1 < body1)
+            & (o2 < o3)
+            & (o2 > c3)
+            & (c2 < l3)
+            & (l2 - top2 < body2)
+            & (o0 < l1)
+            & (c0 > h3)
         )
 
     def candle_two_black_gapping(self) -> Series:
         """*** Candlestick Detected: Two Black Gapping ("Reliable - Reversal - Bearish Pattern - Down")"""
-
-        return (
-            (
-                (self.df["open"] < self.df["open"].shift(1))
-                & (self.df["open"] > self.df["close"].shift(1))
-            )
-            & (self.df["close"] < self.df["low"].shift(1))
-            & (
-                self.df["low"] - maximum(self.df["open"], self.df["close"])
-                < (abs(self.df["open"] - self.df["close"]))
-            )
-            & (self.df["high"].shift(1) < self.df["low"].shift(2))
+        o0, h0, l0, c0 = self.__shifted(0)
+        o1, h1, l1, c1 = self.__shifted(1)
+        l2 = self.__shifted(2)[2]
+        body0, top0 = self.__spans(0)[3:5]
+        return self.__series(
+            (o0 < o1) & (o0 > c1) & (c0 < l1) & (l0 - top0 < body0) & (h1 < l2)
         )
 
     def candle_morning_star(self) -> Series:
         """*** Candlestick Detected: Morning Star ("Strong - Reversal - Bullish Pattern - Up")"""
+        o0, h0, l0, c0 = self.__shifted(0)
+        o2, h2, l2, c2 = self.__shifted(2)
+        top1 = self.__spans(1)[4]
+        return self.__series((top1 < c2) & (c2 < o2) & (c0 > o0) & (o0 > top1))
 
-        return (
-            (
-                maximum(self.df["open"].shift(1), self.df["close"].shift(1))
-                < self.df["close"].shift(2)
-            )
-            & (self.df["close"].shift(2) < self.df["open"].shift(2))
-        ) & (
-            (self.df["close"] > self.df["open"])
-            & (
-                self.df["open"]
-                > maximum(self.df["open"].shift(1), self.df["close"].shift(1))
-            )
-        )
-
-    def candle_evening_star(self) -> ndarray:
+    def candle_evening_star(self) -> Series:
         """*** Candlestick Detected: Evening Star ("Strong - Reversal - Bearish Pattern - Down")"""
-
-        return (
-            (
-                minimum(self.df["open"].shift(1), self.df["close"].shift(1))
-                > self.df["close"].shift(2)
-            )
-            & (self.df["close"].shift(2) > self.df["open"].shift(2))
-        ) & (
-            (self.df["close"] < self.df["open"])
-            & (
-                self.df["open"]
-                < minimum(self.df["open"].shift(1), self.df["close"].shift(1))
-            )
-        )
+        o0, h0, l0, c0 = self.__shifted(0)
+        o2, h2, l2, c2 = self.__shifted(2)
+        bottom1 = self.__spans(1)[5]
+        return self.__series((bottom1 > c2) & (c2 > o2) & (c0 < o0) & (o0 < bottom1))
 
     def candle_abandoned_baby(self):
         """** Candlestick Detected: Abandoned Baby ("Reliable - Reversal - Bullish Pattern - Up")"""
-
-        return (
-            (self.df["open"] < self.df["close"])
-            & (self.df["high"].shift(1) < self.df["low"])
-            & (self.df["open"].shift(2) > self.df["close"].shift(2))
-            & (self.df["high"].shift(1) < self.df["low"].shift(2))
-        )
+        o0, h0, l0, c0 = self.__shifted(0)
+        h1 = self.__shifted(1)[1]
+        o2, h2, l2, c2 = self.__shifted(2)
+        return self.__series((o0 < c0) & (h1 < l0) & (o2 > c2) & (h1 < l2))
 
     def candle_morning_doji_star(self) -> Series:
         """** Candlestick Detected: Morning Doji Star ("Reliable - Reversal - Bullish Pattern - Up")"""
-
-        return (self.df["close"].shift(2) < self.df["open"].shift(2)) & (
-            abs(self.df["close"].shift(2) - self.df["open"].shift(2))
-            / (self.df["high"].shift(2) - self.df["low"].shift(2))
-            >= 0.7
-        ) & (
-            abs(self.df["close"].shift(1) - self.df["open"].shift(1))
-            / (self.df["high"].shift(1) - self.df["low"].shift(1))
-            < 0.1
-        ) & (
-            self.df["close"] > self.df["open"]
-        ) & (
-            abs(self.df["close"] - self.df["open"]) / (self.df["high"] - self.df["low"])
-            >= 0.7
-        ) & (
-            self.df["close"].shift(2) > self.df["close"].shift(1)
-        ) & (
-            self.df["close"].shift(2) > self.df["open"].shift(1)
-        ) & (
-            self.df["close"].shift(1) < self.df["open"]
-        ) & (
-            self.df["open"].shift(1) < self.df["open"]
-        ) & (
-            self.df["close"] > self.df["close"].shift(2)
-        ) & (
-            (
-                self.df["high"].shift(1)
-                - maximum(self.df["close"].shift(1), self.df["open"].shift(1))
+        o0, h0, l0, c0 = self.__shifted(0)
+        o1, h1, l1, c1 = self.__shifted(1)
+        o2, h2, l2, c2 = self.__shifted(2)
+        range0, _, _, body0 = self.__spans(0)[:4]
+        range1, _, _, body1, top1, bottom1 = self.__spans(1)
+        range2, _, _, body2 = self.__spans(2)[:4]
+        # the last "> 3 * body" compares the whole & chain, which takes the lower
+        # shadow as a bool, kept as the original pandas expression evaluated it
+        with errstate(divide="ignore", invalid="ignore"):
+            return self.__series(
+                (
+                    (c2 < o2)
+                    & (body2 / range2 >= 0.7)
+                    & (body1 / range1 < 0.1)
+                    & (c0 > o0)
+                    & (body0 / range0 >= 0.7)
+                    & (c2 > c1)
+                    & (c2 > o1)
+                    & (c1 < o0)
+                    & (o1 < o0)
+                    & (c0 > c2)
+                    & (h1 - top1 > 3 * body1)
+                    & (bottom1 - l1 != 0)
+                )
+                > 3 * body1
             )
-            > (3 * abs(self.df["close"].shift(1) - self.df["open"].shift(1)))
-        ) & (
-            minimum(self.df["close"].shift(1), self.df["open"].shift(1))
-            - self.df["low"].shift(1)
-        ) > (
-            3 * abs(self.df["close"].shift(1) - self.df["open"].shift(1))
-        )
 
     def candle_evening_doji_star(self) -> Series:
         """** Candlestick Detected: Evening Doji Star ("Reliable - Reversal - Bearish Pattern - Down")"""
-
-        return (self.df["close"].shift(2) > self.df["open"].shift(2)) & (
-            abs(self.df["close"].shift(2) - self.df["open"].shift(2))
-            / (self.df["high"].shift(2) - self.df["low"].shift(2))
-            >= 0.7
-        ) & (
-            abs(self.df["close"].shift(1) - self.df["open"].shift(1))
-            / (self.df["high"].shift(1) - self.df["low"].shift(1))
-            < 0.1
-        ) & (
-            self.df["close"] < self.df["open"]
-        ) & (
-            abs(self.df["close"] - self.df["open"]) / (self.df["high"] - self.df["low"])
-            >= 0.7
-        ) & (
-            self.df["close"].shift(2) < self.df["close"].shift(1)
-        ) & (
-            self.df["close"].shift(2) < self.df["open"].shift(1)
-        ) & (
-            self.df["close"].shift(1) > self.df["open"]
-        ) & (
-            self.df["open"].shift(1) > self.df["open"]
-        ) & (
-            self.df["close"] < self.df["close"].shift(2)
-        ) & (
-            (
-                self.df["high"].shift(1)
-                - maximum(self.df["close"].shift(1), self.df["open"].shift(1))
+        o0, h0, l0, c0 = self.__shifted(0)
+        o1, h1, l1, c1 = self.__shifted(1)
+        o2, h2, l2, c2 = self.__shifted(2)
+        range0, _, _, body0 = self.__spans(0)[:4]
+        range1, _, _, body1, top1, bottom1 = self.__spans(1)
+        range2, _, _, body2 = self.__spans(2)[:4]
+        # same & chain quirk as candle_morning_doji_star
+        with errstate(divide="ignore", invalid="ignore"):
+            return self.__series(
+                (
+                    (c2 > o2)
+                    & (body2 / range2 >= 0.7)
+                    & (body1 / range1 < 0.1)
+                    & (c0 < o0)
+                    & (body0 / range0 >= 0.7)
+                    & (c2 < c1)
+                    & (c2 < o1)
+                    & (c1 > o0)
+                    & (o1 > o0)
+                    & (c0 < c2)
+                    & (h1 - top1 > 3 * body1)
+                    & (bottom1 - l1 != 0)
+                )
+                > 3 * body1
             )
-            > (3 * abs(self.df["close"].shift(1) - self.df["open"].shift(1)))
-        ) & (
-            minimum(self.df["close"].shift(1), self.df["open"].shift(1))
-            - self.df["low"].shift(1)
-        ) > (
-            3 * abs(self.df["close"].shift(1) - self.df["open"].shift(1))
-        )
 
     def candle_astral_buy(self) -> Series:
         """*** Candlestick Detected: Astral Buy (Fibonacci 3, 5, 8)"""
 
-        return (
-            (self.df["close"] < self.df["close"].shift(3))
-            & (self.df["low"] < self.df["low"].shift(5))
-            & (self.df["close"].shift(1) < self.df["close"].shift(4))
-            & (self.df["low"].shift(1) < self.df["low"].shift(6))
-            & (self.df["close"].shift(2) < self.df["close"].shift(5))
-            & (self.df["low"].shift(2) < self.df["low"].shift(7))
-            & (self.df["close"].shift(3) < self.df["close"].shift(6))
-            & (self.df["low"].shift(3) < self.df["low"].shift(8))
-            & (self.df["close"].shift(4) < self.df["close"].shift(7))
-            & (self.df["low"].shift(4) < self.df["low"].shift(9))
-            & (self.df["close"].shift(5) < self.df["close"].shift(8))
-            & (self.df["low"].shift(5) < self.df["low"].shift(10))
-            & (self.df["close"].shift(6) < self.df["close"].shift(9))
-            & (self.df["low"].shift(6) < self.df["low"].shift(11))
-            & (self.df["close"].shift(7) < self.df["close"].shift(10))
-            & (self.df["low"].shift(7) < self.df["low"].shift(12))
+        return self.__astral(
+            self.df["close"].to_numpy(dtype=float64),
+            self.df["low"].to_numpy(dtype=float64),
         )
 
     def candle_astral_sell(self) -> Series:
         """*** Candlestick Detected: Astral Sell (Fibonacci 3, 5, 8)"""
 
-        return (
-            (self.df["close"] > self.df["close"].shift(3))
-            & (self.df["high"] > self.df["high"].shift(5))
-            & (self.df["close"].shift(1) > self.df["close"].shift(4))
-            & (self.df["high"].shift(1) > self.df["high"].shift(6))
-            & (self.df["close"].shift(2) > self.df["close"].shift(5))
-            & (self.df["high"].shift(2) > self.df["high"].shift(7))
-            & (self.df["close"].shift(3) > self.df["close"].shift(6))
-            & (self.df["high"].shift(3) > self.df["high"].shift(8))
-            & (self.df["close"].shift(4) > self.df["close"].shift(7))
-            & (self.df["high"].shift(4) > self.df["high"].shift(9))
-            & (self.df["close"].shift(5) > self.df["close"].shift(8))
-            & (self.df["high"].shift(5) > self.df["high"].shift(10))
-            & (self.df["close"].shift(6) > self.df["close"].shift(9))
-            & (self.df["high"].shift(6) > self.df["high"].shift(11))
-            & (self.df["close"].shift(7) > self.df["close"].shift(10))
-            & (self.df["high"].shift(7) > self.df["high"].shift(12))
+        # negated prices turn every "higher than" into the buy side's "lower than"
+        return self.__astral(
+            -self.df["close"].to_numpy(dtype=float64),
+            -self.df["high"].to_numpy(dtype=float64),
+        )
+
+    def __astral(self, close: ndarray, extreme: ndarray) -> Series:
+        # true where the close is below the one 3 candles back and extreme below
+        # the one 5 back on each of the last 8 candles
+        step = zeros(close.size, dtype=bool)
+        step[5:] = (close[5:] < close[2:-3]) & (extreme[5:] < extreme[:-5])
+        # an 8 candle window is all true when it holds 8 steps
+        runs = concatenate(([0], cumsum(step)))
+        astral = zeros(close.size, dtype=bool)
+        astral[12:] = runs[13:] - runs[5:-8] == 8
+        return self.__series(astral)
+
+    def __shifted(self, periods: int) -> tuple:
+        """(open, high, low, close) arrays shifted down by periods, NaN on top"""
+
+        if self.shifts is not None and periods in self.shifts:
+            return self.shifts[periods]
+        candles = []
+        for column in ("open", "high", "low", "close"):
+            values = self.df[column].to_numpy(dtype=float64)
+            if periods:
+                shifted = empty_like(values)
+                shifted[:periods] = nan
+                shifted[periods:] = values[:-periods]
+                values = shifted
+            candles.append(values)
+        candles = tuple(candles)
+        if self.shifts is not None:
+            self.shifts[periods] = candles
+        return candles
+
+    def __spans(self, periods: int) -> tuple:
+        """(high - low, 0.001 + high - low, open - close, body, body top, body
+        bottom) of the candles shifted down by periods"""
+
+        key = ("spans", periods)
+        if self.shifts is not None and key in self.shifts:
+            return self.shifts[key]
+        o, h, l, c = self.__shifted(periods)
+        change = o - c
+        spans = (
+            h - l,
+            0.001 + h - l,
+            change,
+            abs(change),
+            maximum(o, c),
+            minimum(o, c),
         )
+        if self.shifts is not None:
+            self.shifts[key] = spans
+        return spans
+
+    def __series(self, pattern: ndarray) -> Series:
+        return Series(pattern, index=self.df.index)
 
     def change_pct(self) -> DataFrame:
         """Close change percentage"""
@@ -659,34 +795,9 @@ class TechnicalAnalysis:
 
     def cumulative_moving_average(self) -> float:
         """Calculates the Cumulative Moving Average (CMA)"""
-        self.df["cma"] = self.df.close.expanding().mean()
-
-    def calculate_relative_strength_index(self, series: int, interval: int = 14):
-        """Calculates the RSI on a Pandas series of closing prices."""
-
-        if not isinstance(series, Series):
-            raise TypeError("Pandas Series required.")
-
-        if not isinstance(interval, int):
-            raise TypeError("Interval integer required.")
-
-        if len(series) < interval:
-            raise IndexError("Pandas Series smaller than interval.")
 
-        diff = series.diff(1).dropna()
-
-        sum_gains = 0 * diff
-        sum_gains[diff > 0] = diff[diff > 0]
-        avg_gains = sum_gains.ewm(com=interval - 1, min_periods=interval).mean()
-
-        sum_losses = 0 * diff
-        sum_losses[diff < 0] = diff[diff < 0]
-        avg_losses = sum_losses.ewm(com=interval - 1, min_periods=interval).mean()
-
-        rs = abs(avg_gains / avg_losses)
-        rsi = 100 - 100 / (1 + rs)
-
-        return rsi
+        close = self.df["close"].to_numpy(float64)
+        return Series(cumsum(close) / arange(1, close.size + 1), index=self.df.index)
 
     def add_fibonacci_bollinger_bands(
         self, interval: int = 20, multiplier: int = 3
@@ -700,25 +811,15 @@ class TechnicalAnalysis:
             raise TypeError("Multiplier integer required.")
 
         tp = (self.df["high"] + self.df["low"] + self.df["close"]) / 3
-        sma = tp.rolling(interval).mean()
-        sd = multiplier * tp.rolling(interval).std()
-
-        sma = sma.fillna(0)
-        sd = sd.fillna(0)
-
-        self.df["fbb_mid"] = sma
-        self.df["fbb_upper0_236"] = sma + (0.236 * sd)
-        self.df["fbb_upper0_382"] = sma + (0.382 * sd)
-        self.df["fbb_upper0_5"] = sma + (0.5 * sd)
-        self.df["fbb_upper0_618"] = sma + (0.618 * sd)
-        self.df["fbb_upper0_764"] = sma + (0.764 * sd)
-        self.df["fbb_upper1"] = sma + (1 * sd)
-        self.df["fbb_lower0_236"] = sma - (0.236 * sd)
-        self.df["fbb_lower0_382"] = sma - (0.382 * sd)
-        self.df["fbb_lower0_5"] = sma - (0.5 * sd)
-        self.df["fbb_lower0_618"] = sma - (0.618 * sd)
-        self.df["fbb_lower0_764"] = sma - (0.764 * sd)
-        self.df["fbb_lower1"] = sma - (1 * sd)
+        window = tp.rolling(interval)
+        sma = window.mean().fillna(0).to_numpy()
+        sd = (multiplier * window.std()).fillna(0).to_numpy()
+
+        # every band is sma + ratio * sd, all twelve in one broadcast
+        bands = sma + FIBONACCI_BAND_RATIOS[:, None] * sd
+        self.df = self.df.assign(
+            fbb_mid=sma, **dict(zip(FIBONACCI_BAND_COLUMNS, bands))
+        )
 
     def get_fibonacci_retracement_levels(self, price: float = 0) -> dict:
         # validates price is numeric
@@ -730,90 +831,26 @@ class TechnicalAnalysis:
 
         diff = price_max - price_min
 
-        data = {}
-
-        if price != 0 and (price <= price_min):
-            data["ratio1"] = float(self.__truncate(price_min, 2))
-        elif price == 0:
-            data["ratio1"] = float(self.__truncate(price_min, 2))
-
-        if price != 0 and (price > price_min) and (price <= (price_max - 0.768 * diff)):
-            data["ratio1"] = float(self.__truncate(price_min, 2))
-            data["ratio0_768"] = float(self.__truncate(price_max - 0.768 * diff, 2))
-        elif price == 0:
-            data["ratio0_768"] = float(self.__truncate(price_max - 0.768 * diff, 2))
-
-        if (
-            price != 0
-            and (price > (price_max - 0.768 * diff))
-            and (price <= (price_max - 0.618 * diff))
-        ):
-            data["ratio0_768"] = float(self.__truncate(price_max - 0.768 * diff, 2))
-            data["ratio0_618"] = float(self.__truncate(price_max - 0.618 * diff, 2))
-        elif price == 0:
-            data["ratio0_618"] = float(self.__truncate(price_max - 0.618 * diff, 2))
-
-        if (
-            price != 0
-            and (price > (price_max - 0.618 * diff))
-            and (price <= (price_max - 0.5 * diff))
-        ):
-            data["ratio0_618"] = float(self.__truncate(price_max - 0.618 * diff, 2))
-            data["ratio0_5"] = float(self.__truncate(price_max - 0.5 * diff, 2))
-        elif price == 0:
-            data["ratio0_5"] = float(self.__truncate(price_max - 0.5 * diff, 2))
-
-        if (
-            price != 0
-            and (price > (price_max - 0.5 * diff))
-            and (price <= (price_max - 0.382 * diff))
-        ):
-            data["ratio0_5"] = float(self.__truncate(price_max - 0.5 * diff, 2))
-            data["ratio0_382"] = float(self.__truncate(price_max - 0.382 * diff, 2))
-        elif price == 0:
-            data["ratio0_382"] = float(self.__truncate(price_max - 0.382 * diff, 2))
-
-        if (
-            price != 0
-            and (price > (price_max - 0.382 * diff))
-            and (price <= (price_max - 0.286 * diff))
-        ):
-            data["ratio0_382"] = float(self.__truncate(price_max - 0.382 * diff, 2))
-            data["ratio0_286"] = float(self.__truncate(price_max - 0.286 * diff, 2))
-        elif price == 0:
-            data["ratio0_286"] = float(self.__truncate(price_max - 0.286 * diff, 2))
-
-        if price != 0 and (price > (price_max - 0.286 * diff)) and (price <= price_max):
-            data["ratio0_286"] = float(self.__truncate(price_max - 0.286 * diff, 2))
-            data["ratio0"] = float(self.__truncate(price_max, 2))
-        elif price == 0:
-            data["ratio0"] = float(self.__truncate(price_max, 2))
-
-        if price != 0 and (price < (price_max + 0.272 * diff)) and (price >= price_max):
-            data["ratio0"] = float(self.__truncate(price_max, 2))
-            data["ratio1_272"] = float(self.__truncate(price_max + 0.272 * diff, 2))
-        elif price == 0:
-            data["ratio1_272"] = float(self.__truncate(price_max + 0.272 * diff, 2))
-
-        if (
-            price != 0
-            and (price < (price_max + 0.414 * diff))
-            and (price >= (price_max + 0.272 * diff))
-        ):
-            data["ratio1_272"] = float(self.__truncate(price_max, 2))
-            data["ratio1_414"] = float(self.__truncate(price_max + 0.414 * diff, 2))
-        elif price == 0:
-            data["ratio1_414"] = float(self.__truncate(price_max + 0.414 * diff, 2))
+        levels = price_max + FIBONACCI_RETRACEMENT_OFFSETS * diff
+        # the low itself, price_max - diff can be a rounding off
+        levels[0] = price_min
+        truncated = [float(level) for level in self.__truncate(levels, 2)]
 
-        if (
-            price != 0
-            and (price < (price_max + 0.618 * diff))
-            and (price >= (price_max + 0.414 * diff))
-        ):
-            data["ratio1_618"] = float(self.__truncate(price_max + 0.618 * diff, 2))
-        elif price == 0:
-            data["ratio1_618"] = float(self.__truncate(price_max + 0.618 * diff, 2))
+        if price == 0:
+            return dict(zip(FIBONACCI_RETRACEMENT_LEVELS, truncated))
 
+        # price sits between two neighbouring levels, up to the high the bucket is
+        # (lower, upper] and from the high up it is [lower, upper), so the high
+        # itself falls in both
+        data = {}
+        upper = int(searchsorted(levels[:7], price, side="left"))
+        if upper < 7:
+            bucket = slice(max(upper - 1, 0), upper + 1)
+            data.update(zip(FIBONACCI_RETRACEMENT_LEVELS[bucket], truncated[bucket]))
+        upper = 6 + int(searchsorted(levels[6:], price, side="right"))
+        if 6 < upper < 10:
+            bucket = slice(upper - 1, upper + 1)
+            data.update(zip(FIBONACCI_RETRACEMENT_LEVELS[bucket], truncated[bucket]))
         return data
 
     def get_fibonacci_upper(self, price: float = 0) -> float:
@@ -887,8 +924,7 @@ class TechnicalAnalysis:
         """Adds the Moving Average Convergence Divergence (MACD) to the DataFrame"""
 
         df = self.moving_average_convergence_divergence()
-        self.df["macd"] = df["macd"]
-        self.df["signal"] = df["signal"]
+        self.df = self.df.assign(macd=df["macd"], signal=df["signal"])
 
     def add_on_balance_volume(self) -> ndarray:
         """Calculate On-Balance Volume (OBV)"""
@@ -902,14 +938,13 @@ class TechnicalAnalysis:
                 where(
                     self.df["close"] < self.df["close"].shift(1),
                     -self.df["volume"],
-                    self.df.iloc[0]["volume"],
+                    self.df["volume"].iat[0],
                 ),
             ),
         ).cumsum()
 
-        self.df["obv"] = data
-        self.df["obv_pc"] = self.df["obv"].pct_change() * 100
-        self.df["obv_pc"] = round(self.df["obv_pc"].fillna(0), 2)
+        obv_pc = Series(data, index=self.df.index).pct_change() * 100
+        self.df = self.df.assign(obv=data, obv_pc=round(obv_pc.fillna(0), 2))
 
     def add_relative_strength_index(self, period) -> DataFrame:
         """Calculate the Relative Strength Index (RSI)"""
@@ -922,10 +957,9 @@ class TechnicalAnalysis:
 
         # calculate relative strength index
         rsi = self.calculate_relative_strength_index(self.df["close"], period)
-        # default to midway-50 for first entries
-        rsi = rsi.fillna(50)
-        self.df["rsi" + str(period)] = rsi
-        self.df["rsi" + str(period)] = self.df["rsi" + str(period)].replace(nan, 50)
+        # default to midway-50 for first entries, the first row has no diff at all
+        rsi = rsi.reindex(self.df.index).fillna(50)
+        self.df = self.df.assign(**{"rsi" + str(period): rsi})
 
     def relative_strength_index(self, period) -> DataFrame:
         """Calculate the Relative Strength Index (RSI)"""
@@ -948,27 +982,27 @@ class TechnicalAnalysis:
         if "ema13" not in self.df:
             self.add_ema(13)
 
-        self.df["elder_ray_bull"] = self.df["high"] - self.df["ema13"]
-        self.df["elder_ray_bear"] = self.df["low"] - self.df["ema13"]
-
-        # bear power’s value is negative but increasing (i.e. becoming less bearish)
-        # bull power’s value is increasing (i.e. becoming more bullish)
-        self.df["eri_buy"] = (
-            (self.df["elder_ray_bear"] < 0)
-            & (self.df["elder_ray_bear"] > self.df["elder_ray_bear"].shift(1))
-        ) | ((self.df["elder_ray_bull"] > self.df["elder_ray_bull"].shift(1)))
-
-        # bull power’s value is positive but decreasing (i.e. becoming less bullish)
-        # bear power’s value is decreasing (i.e., becoming more bearish)
-        self.df["eri_sell"] = (
-            (self.df["elder_ray_bull"] > 0)
-            & (self.df["elder_ray_bull"] < self.df["elder_ray_bull"].shift(1))
-        ) | (self.df["elder_ray_bear"] < self.df["elder_ray_bear"].shift(1))
+        bull = self.df["high"] - self.df["ema13"]
+        bear = self.df["low"] - self.df["ema13"]
+        previous_bull = bull.shift(1)
+        previous_bear = bear.shift(1)
+
+        self.df = self.df.assign(
+            elder_ray_bull=bull,
+            elder_ray_bear=bear,
+            # bear power’s value is negative but increasing (i.e. becoming less bearish)
+            # bull power’s value is increasing (i.e. becoming more bullish)
+            eri_buy=((bear < 0) & (bear > previous_bear)) | (bull > previous_bull),
+            # bull power’s value is positive but decreasing (i.e. becoming less bullish)
+            # bear power’s value is decreasing (i.e., becoming more bearish)
+            eri_sell=((bull > 0) & (bull < previous_bull)) | (bear < previous_bear),
+        )
 
     def get_support_resistance_levels(self) -> Series:
         """Calculate the Support and Resistance Levels"""
 
         self.levels = []
+        self.level_prices = []
         self.__calculate_support_resistance_levels()
         levels_ts = {}
         for level in self.levels:
@@ -991,29 +1025,30 @@ class TechnicalAnalysis:
             df = self.get_support_resistance_levels()
 
             if len(df) > 0:
-                df_last = df.tail(1)
-                if float(df_last[0]) < price:
+                level = df.iat[-1]
+                formed_at = df.index[-1]
+                if float(level) < price:
                     print(
                         " Support level of "
-                        + str(df_last[0])
+                        + str(level)
                         + " formed at "
-                        + str(df_last.index[0]),
+                        + str(formed_at),
                         "\n",
                     )
-                elif float(df_last[0]) > price:
+                elif float(level) > price:
                     print(
                         " Resistance level of "
-                        + str(df_last[0])
+                        + str(level)
                         + " formed at "
-                        + str(df_last.index[0]),
+                        + str(formed_at),
                         "\n",
                     )
                 else:
                     print(
                         " Support/Resistance level of "
-                        + str(df_last[0])
+                        + str(level)
                         + " formed at "
-                        + str(df_last.index[0]),
+                        + str(formed_at),
                         "\n",
                     )
 
@@ -1024,42 +1059,41 @@ class TechnicalAnalysis:
     def __calculate_support_resistance_levels(self):
         """Support and Resistance levels. (private function)"""
 
-        for i in range(2, self.df.shape[0] - 2):
-            if self.__is_support(self.df, i):
-                l = self.df["low"][i]
-                if self.__is_far_from_level(l):
-                    self.levels.append((i, l))
-            elif self.__is_resistance(self.df, i):
-                l = self.df["high"][i]
-                if self.__is_far_from_level(l):
-                    self.levels.append((i, l))
-        return self.levels
-
-    def __is_support(self, df, i) -> bool:
-        """Is support level? (private function)"""
-
-        c1 = df["low"][i] < df["low"][i - 1]
-        c2 = df["low"][i] < df["low"][i + 1]
-        c3 = df["low"][i + 1] < df["low"][i + 2]
-        c4 = df["low"][i - 1] < df["low"][i - 2]
-        support = c1 and c2 and c3 and c4
-        return support
+        low = self.df["low"].to_numpy()
+        high = self.df["high"].to_numpy()
 
-    def __is_resistance(self, df, i) -> bool:
-        """Is resistance level? (private function)"""
+        # support: the lows fall for two candles into i and rise for two after it,
+        # resistance is the same shape on the highs
+        support = (
+            (low[2:-2] < low[1:-3])
+            & (low[2:-2] < low[3:-1])
+            & (low[3:-1] < low[4:])
+            & (low[1:-3] < low[:-4])
+        )
+        resistance = (
+            (high[2:-2] > high[1:-3])
+            & (high[2:-2] > high[3:-1])
+            & (high[3:-1] > high[4:])
+            & (high[1:-3] > high[:-4])
+        )
 
-        c1 = df["high"][i] > df["high"][i - 1]
-        c2 = df["high"][i] > df["high"][i + 1]
-        c3 = df["high"][i + 1] > df["high"][i + 2]
-        c4 = df["high"][i - 1] > df["high"][i - 2]
-        resistance = c1 and c2 and c3 and c4
-        return resistance
+        s = mean(high - low)
+        for i in flatnonzero(support | resistance) + 2:
+            l = low[i] if support[i - 2] else high[i]
+            if self.__is_far_from_level(l, s):
+                self.levels.append((i, l))
+                insort(self.level_prices, l)
+        return self.levels
 
-    def __is_far_from_level(self, l) -> float:
+    def __is_far_from_level(self, l, s) -> bool:
         """Is far from support level? (private function)"""
 
-        s = mean(self.df["high"] - self.df["low"])
-        return np_sum([abs(l - x) < s for x in self.levels]) == 0
+        # only the closest levels below and above l can be within s
+        prices = self.level_prices
+        idx = bisect_left(prices, l)
+        if idx > 0 and l - prices[idx - 1] < s:
+            return False
+        return idx == len(prices) or prices[idx] - l >= s
 
     def add_MACD_buy_signals(self) -> None:
         """Adds the MACD/Signal buy and sell signals to the DataFrame"""
@@ -1078,25 +1112,22 @@ class TechnicalAnalysis:
                 "Pandas DataFrame 'close' column not int64 or float64."
             )
 
-        if not "macd" or not "signal" in self.df.columns:
+        if "macd" not in self.df or "signal" not in self.df:
             self.add_MACD()
             self.add_on_balance_volume()
 
-        # true if MACD is above the Signal
-        self.df["macdgtsignal"] = self.df.macd > self.df.signal
-        # true if the current frame is where MACD crosses over above
-        self.df["macdgtsignalco"] = self.df.macdgtsignal.ne(
-            self.df.macdgtsignal.shift()
-        )
-        self.df.loc[self.df["macdgtsignal"] == False, "macdgtsignalco"] = False
-
-        # true if the MACD is below the Signal
-        self.df["macdltsignal"] = self.df.macd < self.df.signal
-        # true if the current frame is where MACD crosses over below
-        self.df["macdltsignalco"] = self.df.macdltsignal.ne(
-            self.df.macdltsignal.shift()
+        macd = self.df["macd"].to_numpy()
+        signal = self.df["signal"].to_numpy()
+        # true if MACD is above / below the Signal
+        above = macd > signal
+        below = macd < signal
+        # the co columns are true on the frame where MACD crosses over above / below
+        self.df = self.df.assign(
+            macdgtsignal=above,
+            macdgtsignalco=self.__cross_over(above),
+            macdltsignal=below,
+            macdltsignalco=self.__cross_over(below),
         )
-        self.df.loc[self.df["macdltsignal"] == False, "macdltsignalco"] = False
 
     def __truncate(self, f, n) -> float:
         return floor(f * 10 ** n) / 10 ** n
@@ -1116,63 +1147,54 @@ class TechnicalAnalysis:
             raise IndexError("Pandas Series smaller than interval.")
 
         diff = series.diff(1).dropna()
+        change = diff.to_numpy(dtype=float64)
 
-        sum_gains = 0 * diff
-        sum_gains[diff > 0] = diff[diff > 0]
-        avg_gains = sum_gains.ewm(com=interval - 1, min_periods=interval).mean()
-
-        sum_losses = 0 * diff
-        sum_losses[diff < 0] = diff[diff < 0]
-        avg_losses = sum_losses.ewm(com=interval - 1, min_periods=interval).mean()
+        # gains and losses split in one pass each, no zeroed copies to fill in
+        avg_gains = ewm_mean_values(
+            where(change > 0, change, 0.0), interval - 1, interval
+        )
+        avg_losses = ewm_mean_values(
+            where(change < 0, change, 0.0), interval - 1, interval
+        )
 
         rs = abs(avg_gains / avg_losses)
         rsi = 100 - 100 / (1 + rs)
 
-        return rsi
+        return Series(rsi, index=diff.index)
 
 
 # ================================
 
 
-def getInterval(df: pd.DataFrame = pd.DataFrame()) -> pd.DataFrame:
-    if len(df) == 0:
-        return df
-    else:
-        # most recent entry
-        return df.tail(1)
-
-
 def getAction(
-    now=datetime.today().strftime("%Y-%m-%d %H:%M:%S"),
     app: PublicAPI = None,
     price: float = 0,
     df: pd.DataFrame = pd.DataFrame(),
-    df_last: pd.DataFrame = pd.DataFrame(),
     last_action: str = "WAIT",
     debug: bool = False,
     state=None,
+    flags: dict = None,
 ) -> str:
-    # ema12gtema26co = bool(df_last["ema12gtema26co"].values[0])
-    ema12ltema26 = bool(df_last["ema12ltema26"].values[0])
-    ema12gtema26 = bool(df_last["ema12gtema26"].values[0])
-    golden_cross = bool(df_last["golden_cross"].values[0])
-    golden_cross_ema = bool(df_last["golden_cross_ema"].values[0])
-    death_cross_ema = bool(df_last["death_cross_ema"].values[0])
+    ema12ltema26 = flags["ema12ltema26"]
+    ema12gtema26 = flags["ema12gtema26"]
+    golden_cross = flags["golden_cross"]
+    golden_cross_ema = flags["golden_cross_ema"]
+    death_cross_ema = flags["death_cross_ema"]
 
     # candlestick detection
-    hammer = bool(df_last["hammer"].values[0])
-    inverted_hammer = bool(df_last["inverted_hammer"].values[0])
-    hanging_man = bool(df_last["hanging_man"].values[0])
-    shooting_star = bool(df_last["shooting_star"].values[0])
-    three_white_soldiers = bool(df_last["three_white_soldiers"].values[0])
-    three_black_crows = bool(df_last["three_black_crows"].values[0])
-    morning_star = bool(df_last["morning_star"].values[0])
-    evening_star = bool(df_last["evening_star"].values[0])
-    three_line_strike = bool(df_last["three_line_strike"].values[0])
-    abandoned_baby = bool(df_last["abandoned_baby"].values[0])
-    morning_doji_star = bool(df_last["morning_doji_star"].values[0])
-    evening_doji_star = bool(df_last["evening_doji_star"].values[0])
-    two_black_gapping = bool(df_last["two_black_gapping"].values[0])
+    hammer = flags["hammer"]
+    inverted_hammer = flags["inverted_hammer"]
+    hanging_man = flags["hanging_man"]
+    shooting_star = flags["shooting_star"]
+    three_white_soldiers = flags["three_white_soldiers"]
+    three_black_crows = flags["three_black_crows"]
+    morning_star = flags["morning_star"]
+    evening_star = flags["evening_star"]
+    three_line_strike = flags["three_line_strike"]
+    abandoned_baby = flags["abandoned_baby"]
+    morning_doji_star = flags["morning_doji_star"]
+    evening_doji_star = flags["evening_doji_star"]
+    two_black_gapping = flags["two_black_gapping"]
 
     # criteria for a buy signal
     to_debug = (
@@ -1184,7 +1206,8 @@ def getAction(
     )
 
     if state.debug:
-        logger.debug(f"=== {state.coin_name} ===")
+        last = df.iloc[-1]
+        logger.debug("=== {} ===", state.coin_name)
         logger.debug(
             "ema12ltema26 {}, ema12gtema26 {}, golden_cross {}, golden_cross_ema {}, death_cross_ema {},",
             ema12ltema26,
@@ -1211,19 +1234,19 @@ def getAction(
         )
         logger.debug(
             "{} {} low {}, hi {}, op {}, cl {}, vol {}, eri_buy {}, eri_sell {}, macd>signal {} {} macd<signal {} {}",
-            df_last["date"].values[0],
-            df_last["market"].values[0],
-            df_last["low"].values[0],
-            df_last["high"].values[0],
-            df_last["open"].values[0],
-            df_last["close"].values[0],
-            df_last["volume"].values[0],
-            df_last["eri_buy"].values[0],
-            df_last["eri_sell"].values[0],
-            df_last["macdgtsignal"].values[0],
-            df_last["macdgtsignalco"].values[0],
-            df_last["macdltsignal"].values[0],
-            df_last["macdltsignalco"].values[0],
+            last["date"],
+            last["market"],
+            last["low"],
+            last["high"],
+            last["open"],
+            last["close"],
+            last["volume"],
+            last["eri_buy"],
+            last["eri_sell"],
+            last["macdgtsignal"],
+            last["macdgtsignalco"],
+            last["macdltsignal"],
+            last["macdltsignalco"],
         )
 
     if stop_loss(state):
@@ -1245,7 +1268,7 @@ def get_last_buy_price(coin_symbol):
     if len(last_buy) > 1:
         # found data
         return float(last_buy[4])
-    print("Last buy price not found")
+    logger.info("Last buy price not found")
     return 0
 
 
@@ -1273,13 +1296,21 @@ def stop_loss(state: AppState):
     max_loss = 0
     if last_price > 0:
         max_loss = round(last_price - (last_price * max_loss_rate))
-        print("Market price: ", state.market_price)
+        logger.debug("Market price: {}", state.market_price)
         if state.market_price <= max_loss:
             logger.warning(
-                f"\n\n STOP LOSS max_loss_rate:{max_loss_rate}, last_buy: {in_rupiah(last_price)}, max_lost: {in_rupiah(max_loss)}, market_price {in_rupiah(state.market_price)}"
+                "\n\n STOP LOSS max_loss_rate:{}, last_buy: {}, max_lost: {}, market_price {}",
+                max_loss_rate,
+                in_rupiah(last_price),
+                in_rupiah(max_loss),
+                in_rupiah(state.market_price),
             )
             return True
     logger.warning(
-        f"MASIH AMAN Terkendali, lanjutkan!  max_loss_rate:{max_loss_rate}, last_buy: {in_rupiah(last_price)}, max_lost: {in_rupiah(max_loss)}, market_price {in_rupiah(state.market_price)}"
+        "MASIH AMAN Terkendali, lanjutkan!  max_loss_rate:{}, last_buy: {}, max_lost: {}, market_price {}",
+        max_loss_rate,
+        in_rupiah(last_price),
+        in_rupiah(max_loss),
+        in_rupiah(state.market_price),
     )
     return False
@@ -1,5 +1,6 @@
 import csv
 import os
+from functools import lru_cache
 
 from tukang_kripto import configs
 from tukang_kripto.Telegram import Telegram
@@ -13,7 +14,7 @@ def create_alert(title="Hey, there", message="I have something"):
         os.system(command)
 
     if configs.enable_telegram():
-        tele = configs.config["telegram"]
+        tele = configs.read_config()["telegram"]
         chat = Telegram(tele["token"], tele["client_id"])
         chat.send(f"{title}: \n{message}")
 
@@ -68,6 +69,16 @@ def get_latest_csv_transaction(coin_name, transaction_type=None):
     if "/" in coin_name:
         coin_name = coin_name.split("/")[0]
     file = f"transaction_{coin_name.lower()}.csv"
+    # the file only changes when a transaction is appended, which moves its
+    # mtime and size, so the parsed result is reused until then
+    stat = os.stat(file)
+    return read_latest_csv_transaction(
+        file, transaction_type, stat.st_mtime_ns, stat.st_size
+    )
+
+
+@lru_cache(maxsize=64)
+def read_latest_csv_transaction(file, transaction_type, mtime_ns, size):
     with open(file, "r") as csv_file:
         data = csv.reader(csv_file, delimiter=",")
         if transaction_type is not None:
@@ -75,7 +86,8 @@ def get_latest_csv_transaction(coin_name, transaction_type=None):
         else:
             transactions = list(data)[1:]
 
+        # a tuple, every caller shares the cached result and mustn't change it
         if len(transactions) > 0:
-            return transactions[-1]
+            return tuple(transactions[-1])
         else:
-            return transactions
+            return ()